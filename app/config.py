@@ -10,3 +10,4 @@ DATA_DIR = BASE_DIR / "data"
 DB_PATH = str(DATA_DIR / "step7trend.db")
 
 S7_POLL_INTERVAL = 1.0
+SAMPLE_RETENTION_SEC = 7 * 24 * 3600
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Hashable, List, Optional
+
+# Levels used by the UI: read inputs, mutate widgets, read results
+LEVEL_READ = 0
+LEVEL_WRITE = 1
+LEVEL_POST = 2
+
+
+class LeveledBatch:
+    """Очередь UI-операций, выполняемых раз в кадр по уровням.
+
+    flush() runs every queued level-0 task, then every level-1 task, and so on,
+    so a burst of requests does all its reads before any widget is created.
+    A task added with a key is queued at most once per flush.
+    """
+
+    def __init__(self, levels: int = 3, on_error: Optional[Callable[[Exception], None]] = None) -> None:
+        self._levels: List[List[Callable[[], None]]] = [[] for _ in range(levels)]
+        self._keys: set = set()
+        self._lock = threading.Lock()
+        self.on_error = on_error
+
+    def add(self, level: int, fn: Callable[[], None], key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is not None:
+                if (level, key) in self._keys:
+                    return
+                self._keys.add((level, key))
+            self._levels[level].append(fn)
+
+    def flush(self) -> int:
+        with self._lock:
+            if not any(self._levels):
+                return 0
+            levels = self._levels
+            self._levels = [[] for _ in levels]
+            self._keys = set()
+        count = 0
+        for tasks in levels:
+            for fn in tasks:
+                try:
+                    fn()
+                except Exception as exc:
+                    if self.on_error is not None:
+                        self.on_error(exc)
+                count += 1
+        return count
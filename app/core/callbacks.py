@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import inspect
+from typing import Callable
+
+
+def positional_arity(fn: Callable) -> int:
+    """How many of the DPG callback args (sender, app_data, user_data) to pass to fn.
+
+    All three if fn can take them positionally (as the old fn(sender, app_data,
+    user_data) call did); otherwise only as many as fn requires, so optional
+    parameters such as `def cb(force=False)` keep their defaults.
+    """
+    try:
+        params = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return 3
+    total = 0
+    required = 0
+    for p in params:
+        if p.kind is inspect.Parameter.VAR_POSITIONAL:
+            return 3
+        if p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD):
+            total += 1
+            if p.default is inspect.Parameter.empty:
+                required += 1
+    if total >= 3:
+        return 3
+    return min(required, 3)
@@ -1,49 +1,122 @@
 from __future__ import annotations
 
-import datetime
+import sys
+import threading
+import time
 import traceback
-from collections import deque
 from typing import Callable, Optional
 
 import dearpygui.dearpygui as dpg
 
+from app.core.callbacks import positional_arity
+from app.core.ringlog import RingLog
+
 
 class UILogger:
-    def __init__(self, max_lines: int = 2000):
-        self.buf = deque(maxlen=max_lines)
+    # Console redraw is coalesced: at most once per FLUSH_INTERVAL seconds,
+    # or immediately once FLUSH_THRESHOLD bytes of new text are pending.
+    FLUSH_INTERVAL = 0.1
+    FLUSH_THRESHOLD = 64 * 1024
+    # Only the lines that fit into the console are rendered into the widget;
+    # the full history stays in buf (used by Copy and by Older/Newer paging).
+    LINE_HEIGHT = 20
+
+    def __init__(self, max_lines: int = 2000, capacity: int = 256 * 1024, echo: Optional[bool] = None):
+        self.buf = RingLog(capacity=capacity, max_lines=max_lines)
+        self._buf_lock = threading.Lock()  # log() is called from worker threads too
         self.console_text_tag = "dbg_console_text"
         self.console_child_tag = "dbg_console_child"
         self.status_tag = "status"
 
+        self._pending_size = 0
+        self._dirty = False
+        self._last_flush = 0.0
+
+        self._visible_lines = 40
+        self._anchor: Optional[int] = None  # absolute end line while paged back, None = follow the tail
+
+        # Mirror lines to stdout only for an interactive console unless told otherwise
+        if echo is None:
+            echo = bool(sys.stdout and sys.stdout.isatty())
+        self.echo = echo
+        # (second, "HH:MM:SS"): formatted once per wall-clock second and reused;
+        # kept as one tuple so concurrent log() calls never pair mismatched halves
+        self._ts_cache = (-1, "")
+
     def log(self, msg: str):
-        ts = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        line = f"[{ts}] {msg}"
-        self.buf.append(line)
-        print(line)
+        ns = time.time_ns()
+        sec = ns // 1_000_000_000
+        cached_sec, hms = self._ts_cache
+        if sec != cached_sec:
+            hms = time.strftime("%H:%M:%S", time.localtime(sec))
+            self._ts_cache = (sec, hms)
+        line = f"[{hms}.{(ns // 1_000_000) % 1000:03d}] {msg}"
+        with self._buf_lock:
+            self.buf.append(line)
+        if self.echo:
+            print(line)
 
-        if dpg.does_item_exist(self.console_text_tag):
-            dpg.set_value(self.console_text_tag, "\n".join(self.buf))
+        self._pending_size += len(line) + 1
+        self._dirty = True
+        if self._pending_size >= self.FLUSH_THRESHOLD:
+            self.flush(force=True)
+
+    def flush(self, force: bool = False):
+        """Push buffered lines to the console widget (call from the UI frame loop)."""
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.FLUSH_INTERVAL:
+            return
+        if not dpg.does_item_exist(self.console_text_tag):
+            return
+
+        self._dirty = False
+        self._pending_size = 0
+        self._last_flush = now
+        dpg.set_value(self.console_text_tag, self._visible_text())
+        if self._anchor is None:
             try:
                 dpg.set_y_scroll(self.console_child_tag, 10**9)
             except Exception:
                 pass
 
+    def _visible_text(self) -> str:
+        with self._buf_lock:
+            return self.buf.snapshot(self._visible_lines, end=self._anchor)
+
+    def scroll(self, lines: int):
+        """Move the rendered window: positive = older lines, negative = newer."""
+        with self._buf_lock:
+            total = self.buf.total
+            end = total if self._anchor is None else self._anchor
+            lowest = min(total, self.buf.first_index + self._visible_lines)
+            end = min(total, max(lowest, end - int(lines)))
+            # paged back: pin the window to absolute lines so new ones don't slide it
+            self._anchor = None if end >= total else end
+        self._dirty = True
+        self.flush(force=True)
+
+    def clear(self):
+        with self._buf_lock:
+            self.buf.clear()
+        self._dirty = False
+        self._pending_size = 0
+        self._anchor = None
+        if dpg.does_item_exist(self.console_text_tag):
+            dpg.set_value(self.console_text_tag, "")
+
     def set_status(self, msg: str):
         if dpg.does_item_exist(self.status_tag):
             dpg.set_value(self.status_tag, msg)
 
     def safe_cb(self, name: str, fn: Callable):
+        nargs = positional_arity(fn)
+
         def _wrap(sender=None, app_data=None, user_data=None):
             self.log(f"ACTION: {name}")
             try:
-                return fn(sender, app_data, user_data)
-            except TypeError:
-                try:
-                    return fn()
-                except Exception as e:
-                    self.log(f"ERROR in {name}: {e}")
-                    self.log(traceback.format_exc())
-                    self.set_status(f"ERROR: {e}")
+                return fn(*(sender, app_data, user_data)[:nargs])
             except Exception as e:
                 self.log(f"ERROR in {name}: {e}")
                 self.log(traceback.format_exc())
@@ -58,13 +131,27 @@ class UILogger:
         with dpg.group(**group_kwargs):
             dpg.add_button(
                 label="Clear",
-                callback=lambda: (self.buf.clear(), dpg.set_value(self.console_text_tag, "")),
+                callback=lambda: self.clear(),
             )
             dpg.add_button(
                 label="Copy",
-                callback=lambda: dpg.set_clipboard_text("\n".join(self.buf)),
+                callback=lambda: dpg.set_clipboard_text(self.buf.snapshot()),
+            )
+            dpg.add_button(
+                label="Older",
+                callback=lambda: self.scroll(self._visible_lines),
+            )
+            dpg.add_button(
+                label="Newer",
+                callback=lambda: self.scroll(-self._visible_lines),
+            )
+            dpg.add_button(
+                label="Latest",
+                callback=lambda: self.scroll(-len(self.buf)),
             )
 
+        self._visible_lines = max(1, int(height) // self.LINE_HEIGHT)
+
         child_kwargs = {
             "tag": self.console_child_tag,
             "height": int(height),
@@ -83,4 +170,3 @@ class UILogger:
                 height=-1,
                 default_value="",
             )
-
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Optional
+
+
+class RingLog:
+    """
+    Кольцевой буфер строк лога поверх одного заранее выделенного bytearray.
+    Строки хранятся подряд (UTF-8 + "\\n"), поэтому любое окно из последних
+    строк — это один непрерывный (или разорванный на границе) участок буфера.
+    """
+
+    def __init__(self, capacity: int = 256 * 1024, max_lines: int = 2000):
+        self.capacity = int(capacity)
+        self.max_lines = int(max_lines)
+        self.buf = bytearray(self.capacity)
+        self.head = 0  # next write position
+        self.used = 0
+        self.entries: deque = deque()  # (offset, length) incl. trailing newline
+        self.total = 0  # lines ever appended; absolute index of the next line
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def first_index(self) -> int:
+        """Absolute index of the oldest line still held."""
+        return self.total - len(self.entries)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.head = 0
+        self.used = 0
+        self.total = 0
+
+    def append(self, line: str) -> None:
+        data = line.encode("utf-8", errors="replace")[: self.capacity - 1] + b"\n"
+        n = len(data)
+        while self.entries and (self.used + n > self.capacity or len(self.entries) >= self.max_lines):
+            _, old_len = self.entries.popleft()
+            self.used -= old_len
+
+        off = self.head
+        first = min(n, self.capacity - off)
+        view = memoryview(self.buf)
+        view[off:off + first] = data[:first]
+        if first < n:
+            view[0:n - first] = data[first:]
+        self.entries.append((off, n))
+        self.head = (off + n) % self.capacity
+        self.used += n
+        self.total += 1
+
+    def snapshot(self, n: Optional[int] = None, skip: int = 0, end: Optional[int] = None) -> str:
+        """Last n lines (all if n is None), ending `skip` lines before the newest.
+
+        With `end` (an absolute line index, see `total`) the window ends right
+        before that line instead, so it stays put while new lines arrive.
+        """
+        total = len(self.entries)
+        if end is None:
+            end = max(0, total - int(skip))
+        else:
+            # lines evicted under a pinned window: show the oldest ones still held
+            floor = total if n is None else min(total, int(n))
+            end = min(total, max(floor, int(end) - self.first_index))
+        start = 0 if n is None else max(0, end - int(n))
+        if start >= end:
+            return ""
+        first_off = self.entries[start][0]
+        last_off, last_len = self.entries[end - 1]
+        stop = last_off + last_len
+        if stop <= self.capacity and first_off <= last_off:
+            data = bytes(self.buf[first_off:stop])
+        else:
+            data = bytes(self.buf[first_off:]) + bytes(self.buf[:stop % self.capacity])
+        return data[:-1].decode("utf-8", errors="replace")
@@ -29,6 +29,8 @@ class DiagramEditor:
 
         self.nodes: Dict[str, DeviceNode] = {}
         self.links: List[Tuple[str, str]] = []  # (out_attr_tag, in_attr_tag)
+        # node id -> DPG item tags ("node", "in", "out", "name", "ip"), built once per node
+        self._node_tags: Dict[str, Dict[str, str]] = {}
 
     # ---------- UI build ----------
     def build(self, parent: Optional[str] = None, height: int = 360):
@@ -49,6 +51,7 @@ class DiagramEditor:
     def clear(self):
         self.nodes.clear()
         self.links.clear()
+        self._node_tags.clear()
         if dpg.does_item_exist(self.node_editor_tag):
             dpg.delete_item(self.node_editor_tag, children_only=True)
 
@@ -64,12 +67,27 @@ class DiagramEditor:
         self._render_node(node)
 
     # ---------- Render node ----------
+    def _tags_for(self, node_id: str) -> Dict[str, str]:
+        tags = self._node_tags.get(node_id)
+        if tags is None:
+            node_tag = f"{self.tag_prefix}::node::{node_id}"
+            tags = {
+                "node": node_tag,
+                "in": f"{node_tag}::in",
+                "out": f"{node_tag}::out",
+                "name": f"{node_tag}::name",
+                "ip": f"{node_tag}::ip",
+            }
+            self._node_tags[node_id] = tags
+        return tags
+
     def _render_node(self, node: DeviceNode):
-        node_tag = f"{self.tag_prefix}::node::{node.id}"
-        in_attr = f"{node_tag}::in"
-        out_attr = f"{node_tag}::out"
-        name_tag = f"{node_tag}::name"
-        ip_tag = f"{node_tag}::ip"
+        tags = self._tags_for(node.id)
+        node_tag = tags["node"]
+        in_attr = tags["in"]
+        out_attr = tags["out"]
+        name_tag = tags["name"]
+        ip_tag = tags["ip"]
 
         with dpg.node(tag=node_tag, parent=self.node_editor_tag, label=node.name):
             with dpg.node_attribute(tag=in_attr, attribute_type=dpg.mvNode_Attr_Input):
@@ -97,16 +115,13 @@ class DiagramEditor:
 
     def _update_name(self, node_id: str):
         node = self.nodes[node_id]
-        node_tag = f"{self.tag_prefix}::node::{node.id}"
-        name_tag = f"{node_tag}::name"
-        node.name = dpg.get_value(name_tag)
-        dpg.configure_item(node_tag, label=node.name)
+        tags = self._node_tags[node_id]
+        node.name = dpg.get_value(tags["name"])
+        dpg.configure_item(tags["node"], label=node.name)
 
     def _update_ip(self, node_id: str):
         node = self.nodes[node_id]
-        node_tag = f"{self.tag_prefix}::node::{node.id}"
-        ip_tag = f"{node_tag}::ip"
-        node.ip = dpg.get_value(ip_tag)
+        node.ip = dpg.get_value(self._node_tags[node_id]["ip"])
 
     # ---------- Linking callbacks ----------
     def _link_callback(self, sender, app_data):
@@ -140,19 +155,22 @@ class DiagramEditor:
         payload = json.loads(text)
         self.clear()
 
-        for n in payload.get("nodes", []):
-            node = DeviceNode(**n)
-            self.nodes[node.id] = node
-            self._render_node(node)
-
-        for l in payload.get("links", []):
-            out_attr = l["out"]
-            in_attr = l["in"]
-            try:
-                dpg.add_node_link(out_attr, in_attr, parent=self.node_editor_tag)
-                self.links.append((out_attr, in_attr))
-            except Exception:
-                pass
+        # Build the whole diagram while holding the render mutex so the editor
+        # is not laid out between nodes; links go in only after all nodes exist.
+        with dpg.mutex():
+            for n in payload.get("nodes", []):
+                node = DeviceNode(**n)
+                self.nodes[node.id] = node
+                self._render_node(node)
+
+            for l in payload.get("links", []):
+                out_attr = l["out"]
+                in_attr = l["in"]
+                try:
+                    dpg.add_node_link(out_attr, in_attr, parent=self.node_editor_tag)
+                    self.links.append((out_attr, in_attr))
+                except Exception:
+                    pass
 
     def show_save_dialog(self):
         tag = f"{self.tag_prefix}::save_win"
@@ -1,8 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import csv
+import ctypes
+import io
+import queue
 import struct
+import sys
 import importlib
 import traceback
 
@@ -49,6 +56,32 @@ if SNAP7_IMPORT_ERROR:
         )
 
 
+# snap7 limit: max number of items in one read_multi_vars request
+S7_MAX_VARS = 20
+# Read-var PDU layout: request = header + 12 bytes per item,
+# response = header + (4 + data, padded to even) per item.
+S7_PDU_DEFAULT = 240
+S7_REQ_HEADER = 12
+S7_REQ_ITEM = 12
+S7_RESP_HEADER = 14
+S7_RESP_ITEM = 4
+# Read planner: tags of the same area/DB closer than S7_BLOCK_MAX_GAP bytes are
+# fetched as one block; a block never exceeds what fits into a 240-byte PDU.
+S7_BLOCK_MAX_GAP = 32
+S7_BLOCK_MAX_LEN = S7_PDU_DEFAULT - S7_RESP_HEADER - S7_RESP_ITEM
+
+
+_SIZES = {
+    "BOOL": 1,
+    "BYTE": 1,
+    "WORD": 2,
+    "DWORD": 4,
+    "INT": 2,
+    "DINT": 4,
+    "REAL": 4,
+}
+
+
 @dataclass(frozen=True)
 class TagSpec:
     name: str
@@ -57,27 +90,120 @@ class TagSpec:
     byte_index: int
     data_type: str  # BOOL, BYTE, WORD, DWORD, INT, DINT, REAL
     bit_index: Optional[int] = None
+    deadband: float = 0.0  # min |change| to store a new sample; 0 = any change
+
+    # derived once in __post_init__; used on the read/write hot path
+    _dtype: str = field(init=False, repr=False, compare=False)
+    _size: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        dtype = self.data_type.upper()
+        if dtype not in _SIZES:
+            raise ValueError(f"Unsupported data type '{self.data_type}'")
+        # Names/areas repeat across state maps, samples and plans: share one object each
+        object.__setattr__(self, "name", sys.intern(self.name))
+        object.__setattr__(self, "area", sys.intern(self.area))
+        object.__setattr__(self, "data_type", sys.intern(self.data_type))
+        object.__setattr__(self, "_dtype", sys.intern(dtype))
+        object.__setattr__(self, "_size", _SIZES[dtype])
 
     def size(self) -> int:
-        sizes = {
-            "BOOL": 1,
-            "BYTE": 1,
-            "WORD": 2,
-            "DWORD": 4,
-            "INT": 2,
-            "DINT": 4,
-            "REAL": 4,
-        }
-        return sizes[self.data_type.upper()]
+        return self._size
+
+
+def parse_tags_csv(text: str) -> Tuple[List[TagSpec], List[str]]:
+    """
+    Parse tag import text: name, area, db, byte_index, data_type[, bit_index[, deadband]].
+    A bad row (missing fields, bad number, unknown data type) is reported in the
+    errors list and skipped; the other rows are still imported.
+    """
+    tags: List[TagSpec] = []
+    errors: List[str] = []
+    reader = csv.reader(io.StringIO(text), skipinitialspace=True)
+    for row in reader:
+        idx = reader.line_num
+        parts = [p.strip() for p in row]
+        if not parts or not any(parts) or parts[0].startswith("#"):
+            continue
+        if len(parts) < 5:
+            errors.append(f"Строка {idx}: недостаточно полей")
+            continue
+        if idx == 1 and parts[0].lower() == "name" and parts[1].lower() == "area":
+            continue
+        try:
+            tag = TagSpec(
+                name=parts[0],
+                area=parts[1],
+                db=int(parts[2]),
+                byte_index=int(parts[3]),
+                data_type=parts[4],
+                bit_index=int(parts[5]) if len(parts) > 5 and parts[5] else None,
+                deadband=float(parts[6]) if len(parts) > 6 and parts[6] else 0.0,
+            )
+        except ValueError as exc:
+            errors.append(f"Строка {idx}: ошибка преобразования ({exc})")
+            continue
+        tags.append(tag)
+    return tags, errors
+
+
+@dataclass
+class ReadBlock:
+    area: str
+    db: int
+    start: int
+    length: int
+    tags: List[Tuple[TagSpec, int]] = field(default_factory=list)  # (tag, offset in block)
+    # receive buffer, allocated once when the block is first read and reused after that
+    buf: Optional[ctypes.Array] = field(default=None, repr=False, compare=False)
+
+
+def plan_reads(
+    tags: List[TagSpec],
+    max_gap: int = S7_BLOCK_MAX_GAP,
+    max_len: int = S7_BLOCK_MAX_LEN,
+) -> List[ReadBlock]:
+    """Group tags by (area, db) and merge neighbouring byte ranges into read blocks."""
+    groups: Dict[Tuple[str, int], List[TagSpec]] = {}
+    for tag in tags:
+        groups.setdefault((tag.area.upper(), tag.db), []).append(tag)
+
+    blocks: List[ReadBlock] = []
+    for (area, db), group in groups.items():
+        group.sort(key=lambda t: t.byte_index)
+        block: Optional[ReadBlock] = None
+        for tag in group:
+            end = tag.byte_index + tag._size
+            if (
+                block is not None
+                and tag.byte_index - (block.start + block.length) <= max_gap
+                and end - block.start <= max_len
+            ):
+                block.length = max(block.length, end - block.start)
+                block.tags.append((tag, tag.byte_index - block.start))
+                continue
+            block = ReadBlock(area=area, db=db, start=tag.byte_index, length=tag._size, tags=[(tag, 0)])
+            blocks.append(block)
+    return blocks
 
 
 class S7Driver:
-    def __init__(self, ip: str, rack: int = 0, slot: int = 1, port: int = 102):
+    def __init__(self, ip: str, rack: int = 0, slot: int = 1, port: int = 102, pool_size: int = 1):
         self.ip = ip
         self.rack = rack
         self.slot = slot
         self.port = port
-        self.client = None
+        self.client = None  # first connection; kept for status checks
+        # Connection pool: each request checks out one snap7 client, so reads and
+        # writes from different threads do not share (or wait on) one connection.
+        self.pool_size = max(1, int(pool_size))
+        self._clients: list = []
+        self._pool: Optional[queue.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pdu_length = S7_PDU_DEFAULT  # negotiated on connect
+        # S7DataItem arrays prepared for the last read plan (reused while the plan is unchanged)
+        self._plan: Optional[List[ReadBlock]] = None
+        self._batches: List[Tuple[ctypes.Array, List[ReadBlock]]] = []
 
     def connect(self) -> None:
         if not SNAP7_AVAILABLE:
@@ -85,36 +211,164 @@ class S7Driver:
                 SNAP7_IMPORT_ERROR
                 or "python-snap7 не установлен. Установите: pip install python-snap7"
             )
-        self.client = snap7.client.Client()
-        self.client.connect(self.ip, self.rack, self.slot, self.port)
+        clients = []
+        for _ in range(self.pool_size):
+            client = snap7.client.Client()
+            try:
+                client.connect(self.ip, self.rack, self.slot, self.port)
+            except Exception:
+                if not clients:
+                    raise
+                break  # PLC refused an extra connection: keep the ones we have
+            clients.append(client)
+        pool: queue.Queue = queue.Queue()
+        for client in clients:
+            pool.put(client)
+        self._clients = clients
+        self._pool = pool
+        self.client = clients[0]
+        self.pdu_length = _negotiated_pdu(clients[0])
+        self._plan = None
+
+    def max_block_len(self) -> int:
+        """Largest block (bytes) one read item can return with the negotiated PDU."""
+        return self.pdu_length - S7_RESP_HEADER - S7_RESP_ITEM
+
+    def connection_count(self) -> int:
+        return len(self._clients)
 
     def disconnect(self) -> None:
-        if self.client:
-            self.client.disconnect()
-            self.client = None
+        clients, self._clients = self._clients, []
+        self._pool = None
+        self.client = None
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for client in clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
 
-    def read_tag(self, tag: TagSpec):
-        if not self.client:
+    @contextmanager
+    def _checkout(self) -> Iterator:
+        pool = self._pool
+        if pool is None:
             raise RuntimeError("S7 client is not connected")
+        client = pool.get()
+        try:
+            yield client
+        finally:
+            pool.put(client)
+
+    def read_tag(self, tag: TagSpec):
         area = _area_to_snap7(tag.area)
-        size = tag.size()
-        data = self.client.read_area(area, tag.db, tag.byte_index, size)
+        size = tag._size
+        with self._checkout() as client:
+            data = client.read_area(area, tag.db, tag.byte_index, size)
         return _decode_value(tag, data)
 
-    def write_tag(self, tag: TagSpec, value) -> None:
-        if not self.client:
+    def read_blocks(self, blocks: List[ReadBlock]) -> dict:
+        """Fetch planned blocks with read_multi_vars and decode every tag from its block."""
+        if self._pool is None:
             raise RuntimeError("S7 client is not connected")
+        if self._plan is not blocks:
+            self._batches = _prepare_batches(blocks, self.pdu_length)
+            self._plan = blocks
+        batches = self._batches
+        if len(batches) > 1 and len(self._clients) > 1:
+            # independent requests: run them on several pooled connections at once
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self._clients))
+            for _ in self._executor.map(self._read_batch, batches):
+                pass
+        else:
+            for batch in batches:
+                self._read_batch(batch)
+        values = {}
+        for items, chunk in batches:
+            for item, block in zip(items, chunk):
+                if item.Result != 0:
+                    raise RuntimeError(
+                        f"S7 read of {block.area}{block.db}.{block.start} ({block.length} bytes) "
+                        f"failed (result=0x{item.Result:X})"
+                    )
+                buf = block.buf
+                for tag, offset in block.tags:
+                    values[tag.name] = _decode_value(tag, buf, offset)
+        return values
+
+    def _read_batch(self, batch: Tuple[ctypes.Array, List[ReadBlock]]) -> None:
+        with self._checkout() as client:
+            client.read_multi_vars(batch[0])
+
+    def write_tag(self, tag: TagSpec, value) -> None:
         area = _area_to_snap7(tag.area)
-        size = tag.size()
+        size = tag._size
+
+        with self._checkout() as client:
+            if tag._dtype == "BOOL":
+                data = bytearray(client.read_area(area, tag.db, tag.byte_index, size))
+                _set_bool(data, 0, tag.bit_index or 0, bool(value))
+                client.write_area(area, tag.db, tag.byte_index, data)
+                return
+
+            data = _encode_value(tag, value)
+            client.write_area(area, tag.db, tag.byte_index, data)
+
 
-        if tag.data_type.upper() == "BOOL":
-            data = bytearray(self.client.read_area(area, tag.db, tag.byte_index, size))
-            _set_bool(data, 0, tag.bit_index or 0, bool(value))
-            self.client.write_area(area, tag.db, tag.byte_index, data)
-            return
+def _pack_batches(blocks: List[ReadBlock], pdu_length: int) -> List[List[ReadBlock]]:
+    """Split blocks into read_multi_vars requests whose request and response fit one PDU."""
+    max_items = max(1, min(S7_MAX_VARS, (pdu_length - S7_REQ_HEADER) // S7_REQ_ITEM))
+    chunks: List[List[ReadBlock]] = []
+    chunk: List[ReadBlock] = []
+    resp = S7_RESP_HEADER
+    for block in blocks:
+        size = S7_RESP_ITEM + block.length + (block.length & 1)
+        if chunk and (len(chunk) >= max_items or resp + size > pdu_length):
+            chunks.append(chunk)
+            chunk = []
+            resp = S7_RESP_HEADER
+        chunk.append(block)
+        resp += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
-        data = _encode_value(tag, value)
-        self.client.write_area(area, tag.db, tag.byte_index, data)
+
+def _prepare_batches(
+    blocks: List[ReadBlock], pdu_length: int = S7_PDU_DEFAULT
+) -> List[Tuple[ctypes.Array, List[ReadBlock]]]:
+    """
+    Build S7DataItem arrays (one per PDU-sized request, see _pack_batches) whose
+    pData point at the blocks' own buffers, so steady-state polling allocates
+    nothing per read.
+    """
+    batches = []
+    wordlen = _wordlen_byte()
+    for chunk in _pack_batches(blocks, pdu_length):
+        items = (snap7_types.S7DataItem * len(chunk))()
+        for item, block in zip(items, chunk):
+            if block.buf is None or len(block.buf) != block.length:
+                block.buf = (ctypes.c_uint8 * block.length)()
+            item.Area = _enum_int(_area_to_snap7(block.area))
+            item.WordLen = wordlen
+            item.Result = 0
+            item.DBNumber = block.db
+            item.Start = block.start
+            item.Amount = block.length
+            item.pData = ctypes.cast(block.buf, ctypes.POINTER(ctypes.c_uint8))
+        batches.append((items, chunk))
+    return batches
+
+
+def _negotiated_pdu(client) -> int:
+    try:
+        pdu = int(client.get_pdu_length())
+    except Exception:
+        return S7_PDU_DEFAULT
+    # 0 = not negotiated (some snap7 builds/servers): assume the classic 240
+    return pdu if pdu > S7_RESP_HEADER + S7_RESP_ITEM else S7_PDU_DEFAULT
 
 
 def _area_to_snap7(area: str) -> int:
@@ -132,77 +386,52 @@ def _area_to_snap7(area: str) -> int:
     return mapping[area]
 
 
-def _decode_value(tag: TagSpec, data: bytes):
-    dtype = tag.data_type.upper()
-    if dtype == "BOOL":
-        return _get_bool(data, 0, tag.bit_index or 0)
-    if snap7_util:
-        if dtype == "BYTE":
-            return data[0]
-        if dtype == "WORD":
-            return snap7_util.get_word(data, 0)
-        if dtype == "DWORD":
-            return snap7_util.get_dword(data, 0)
-        if dtype == "INT":
-            return snap7_util.get_int(data, 0)
-        if dtype == "DINT":
-            return snap7_util.get_dint(data, 0)
-        if dtype == "REAL":
-            return snap7_util.get_real(data, 0)
+def _enum_int(value) -> int:
+    # python-snap7 1.x: Areas/WordLen are plain Enum (int() raises TypeError),
+    # 2.x: IntEnum; older builds expose bare ints
+    return int(getattr(value, "value", value))
+
 
+def _wordlen_byte() -> int:
+    if not snap7_types:
+        raise RuntimeError("snap7 types are not available")
+    wordlen = getattr(snap7_types, "WordLen", None)
+    if wordlen is not None:
+        return _enum_int(wordlen.Byte)
+    return _enum_int(getattr(snap7_types, "S7WLByte", 0x02))
+
+
+# Precompiled big-endian codecs for the numeric S7 types (BOOL/BYTE handled inline)
+_STRUCTS = {
+    "WORD": struct.Struct(">H"),
+    "DWORD": struct.Struct(">I"),
+    "INT": struct.Struct(">h"),
+    "DINT": struct.Struct(">i"),
+    "REAL": struct.Struct(">f"),
+}
+
+
+def _decode_value(tag: TagSpec, data: bytes, offset: int = 0):
+    dtype = tag._dtype
+    codec = _STRUCTS.get(dtype)
+    if codec is not None:
+        return codec.unpack_from(data, offset)[0]
+    if dtype == "BOOL":
+        return _get_bool(data, offset, tag.bit_index or 0)
     if dtype == "BYTE":
-        return data[0]
-    if dtype == "WORD":
-        return struct.unpack(">H", data)[0]
-    if dtype == "DWORD":
-        return struct.unpack(">I", data)[0]
-    if dtype == "INT":
-        return struct.unpack(">h", data)[0]
-    if dtype == "DINT":
-        return struct.unpack(">i", data)[0]
-    if dtype == "REAL":
-        return struct.unpack(">f", data)[0]
+        return data[offset]
     raise ValueError(f"Unsupported data type '{tag.data_type}'")
 
 
 def _encode_value(tag: TagSpec, value) -> bytes:
-    dtype = tag.data_type.upper()
-    if snap7_util:
-        if dtype == "BYTE":
-            return bytes([int(value)])
-        if dtype == "WORD":
-            buff = bytearray(2)
-            snap7_util.set_word(buff, 0, int(value))
-            return buff
-        if dtype == "DWORD":
-            buff = bytearray(4)
-            snap7_util.set_dword(buff, 0, int(value))
-            return buff
-        if dtype == "INT":
-            buff = bytearray(2)
-            snap7_util.set_int(buff, 0, int(value))
-            return buff
-        if dtype == "DINT":
-            buff = bytearray(4)
-            snap7_util.set_dint(buff, 0, int(value))
-            return buff
-        if dtype == "REAL":
-            buff = bytearray(4)
-            snap7_util.set_real(buff, 0, float(value))
-            return buff
-
+    dtype = tag._dtype
+    if dtype == "REAL":
+        return _STRUCTS["REAL"].pack(float(value))
+    codec = _STRUCTS.get(dtype)
+    if codec is not None:
+        return codec.pack(int(value))
     if dtype == "BYTE":
         return bytes([int(value)])
-    if dtype == "WORD":
-        return struct.pack(">H", int(value))
-    if dtype == "DWORD":
-        return struct.pack(">I", int(value))
-    if dtype == "INT":
-        return struct.pack(">h", int(value))
-    if dtype == "DINT":
-        return struct.pack(">i", int(value))
-    if dtype == "REAL":
-        return struct.pack(">f", float(value))
     raise ValueError(f"Unsupported data type '{tag.data_type}'")
 
 
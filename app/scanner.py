@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import errno
 import ipaddress
-import socket
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+SCAN_MAX_CONCURRENCY = 4096
+# File descriptors left for the rest of the app (SQLite, PLC sockets, fonts...)
+SCAN_FD_HEADROOM = 64
+# Connect attempts that hit the fd limit are retried, not reported as closed
+SCAN_FD_RETRIES = 5
 
 
 @dataclass
@@ -13,12 +24,40 @@ class HostHit:
     open_ports: List[int]
 
 
-def _tcp_check(ip: str, port: int, timeout: float) -> bool:
+async def _tcp_check_async(ip: str, port: int, timeout: float) -> bool:
+    attempt = 0
+    while True:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except OSError as exc:
+            # EMFILE/ENFILE: out of descriptors locally, says nothing about the port
+            if exc.errno in (errno.EMFILE, errno.ENFILE) and attempt < SCAN_FD_RETRIES:
+                attempt += 1
+                await asyncio.sleep(0.05 * attempt)
+                continue
+            return False
+        except Exception:
+            return False
+        break
+    writer.close()
     try:
-        with socket.create_connection((ip, port), timeout=timeout):
-            return True
+        await writer.wait_closed()
     except Exception:
-        return False
+        pass
+    return True
+
+
+def _max_concurrency() -> int:
+    """Upper bound for simultaneous connects: below the process fd limit (RLIMIT_NOFILE)."""
+    if resource is None:
+        return SCAN_MAX_CONCURRENCY
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (OSError, ValueError):
+        return SCAN_MAX_CONCURRENCY
+    if soft == resource.RLIM_INFINITY:
+        return SCAN_MAX_CONCURRENCY
+    return max(1, min(SCAN_MAX_CONCURRENCY, soft - SCAN_FD_HEADROOM))
 
 
 def _parse_targets(target: str) -> List[ipaddress._BaseAddress]:
@@ -40,17 +79,16 @@ def _parse_targets(target: str) -> List[ipaddress._BaseAddress]:
     return [ip]
 
 
-def scan_sync(
+async def scan_async(
     target: str,
     ports: List[int],
     timeout: float = 0.25,
-    workers: int = 256,
+    concurrency: int = 1024,
     limit_hosts: Optional[int] = None,
 ) -> List[HostHit]:
     """
-    TCP connect scan.
-    - target: CIDR (10.10.101.0/24) или одиночный IP (10.92.44.222)
-    - ports: список портов для проверки
+    TCP connect scan на asyncio: все пробы (host, port) идут в одном потоке,
+    одновременно открыто не больше `concurrency` соединений.
     Возвращает список HostHit, где открыт хотя бы один порт.
     """
     if not ports:
@@ -64,36 +102,61 @@ def scan_sync(
             limit_hosts = 0
         hosts = hosts[:limit_hosts]
 
-    workers = int(workers)
-    if workers < 1:
-        workers = 1
-    if workers > 1024:
-        workers = 1024
+    concurrency = int(concurrency)
+    if concurrency < 1:
+        concurrency = 1
+    concurrency = min(concurrency, _max_concurrency())
 
     timeout = float(timeout)
     if timeout <= 0:
         timeout = 0.25
 
-    ports_int = [int(p) for p in ports]
+    ports_int = list(dict.fromkeys(int(p) for p in ports))  # dedupe, keep requested order
 
-    def check_host(ip_obj: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> Optional[HostHit]:
-        ip = str(ip_obj)
-        open_ports: List[int] = []
-        for p in ports_int:
-            if _tcp_check(ip, p, timeout):
-                open_ports.append(p)
-        if open_ports:
-            return HostHit(ip=ip, open_ports=open_ports)
-        return None
+    # A fixed pool of worker coroutines pulls probes from a shared iterator,
+    # so memory stays O(concurrency) even for a /16 (no task per probe).
+    # Probes go port by port (sorted) across all hosts: each wave hits one port.
+    host_ips = [str(h) for h in hosts]
+    probes: Iterator[Tuple[str, int]] = ((ip, p) for p in sorted(ports_int) for ip in host_ips)
+    open_by_ip: Dict[str, List[int]] = {}
 
-    hits: List[HostHit] = []
+    async def worker() -> None:
+        for ip, p in probes:
+            if await _tcp_check_async(ip, p, timeout):
+                open_by_ip.setdefault(ip, []).append(p)
 
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = [ex.submit(check_host, h) for h in hosts]
-        for f in as_completed(futures):
-            r = f.result()
-            if r is not None:
-                hits.append(r)
+    n_workers = min(concurrency, len(host_ips) * len(ports_int)) or 1
+    await asyncio.gather(*(worker() for _ in range(n_workers)))
 
+    port_order = {p: i for i, p in enumerate(ports_int)}
+    hits = [
+        HostHit(ip=ip, open_ports=sorted(open_ports, key=port_order.__getitem__))
+        for ip, open_ports in open_by_ip.items()
+    ]
     hits.sort(key=lambda x: ipaddress.ip_address(x.ip))
     return hits
+
+
+def scan_sync(
+    target: str,
+    ports: List[int],
+    timeout: float = 0.25,
+    workers: int = 256,
+    limit_hosts: Optional[int] = None,
+) -> List[HostHit]:
+    """
+    TCP connect scan.
+    - target: CIDR (10.10.101.0/24) или одиночный IP (10.92.44.222)
+    - ports: список портов для проверки
+    - workers: сколько соединений проверяется одновременно
+    Возвращает список HostHit, где открыт хотя бы один порт.
+    """
+    return asyncio.run(
+        scan_async(
+            target=target,
+            ports=ports,
+            timeout=timeout,
+            concurrency=workers,
+            limit_hosts=limit_hosts,
+        )
+    )
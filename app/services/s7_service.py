@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import threading
 import time
-from typing import Callable, Iterable, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from app.drivers.s7_driver import S7Driver, TagSpec
+from app.drivers.s7_driver import ReadBlock, S7Driver, TagSpec, plan_reads
+from app.storage.trend_buffer import TrendBuffer
 from app.storage.workspace import WorkspaceStorage
 from app.state import AppState
 
@@ -17,27 +18,53 @@ class S7Service:
         poll_interval: float = 1.0,
         state: Optional[AppState] = None,
         logger: Optional[Callable[[str], None]] = None,
+        retention_s: Optional[float] = None,
+        prune_interval_s: float = 3600.0,
+        heartbeat_s: float = 60.0,
+        trend_buffer: Optional[TrendBuffer] = None,
+        pool_size: int = 1,
     ) -> None:
         self.storage = storage
         self.tags: List[TagSpec] = list(tags or [])
+        self._tag_by_name: Dict[str, TagSpec] = {tag.name: tag for tag in self.tags}
         self.active_tags: List[TagSpec] = list(self.tags)
+        self._read_plan: List[ReadBlock] = self._plan_reads(self.active_tags)
         self.poll_interval = poll_interval
         self.state = state
         self.logger = logger or (lambda msg: None)
+        # Old samples are pruned by the storage's retention thread every
+        # prune_interval_s seconds once polling starts (None = keep all)
+        self.retention_s = retention_s
+        self.prune_interval_s = float(prune_interval_s)
+        # Delta storage: a polled value is stored only if it moved by more than
+        # the tag's deadband, or if nothing was stored for heartbeat_s seconds.
+        self.heartbeat_s = float(heartbeat_s)
+        self._last_stored: Dict[str, Tuple[float, float]] = {}  # name -> (value, ts)
+        # Every polled value (deadband or not) also goes to the in-memory trend buffer
+        self.trend_buffer = trend_buffer
+        # S7 connections opened per PLC (opt-in > 1; connections the PLC refuses
+        # are skipped). Each one takes a CPU connection resource that HMI/PG also need.
+        self.pool_size = pool_size
 
         self.driver: Optional[S7Driver] = None
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
         self._lock = threading.Lock()
         self._last_ok_ts: Optional[float] = None
+        # set when the tag table changes; the poll loop then re-syncs state.available_tags
+        self._tags_dirty = True
 
         if self.tags:
             self.storage.upsert_tags(self.tags)
 
     def connect(self, ip: str, rack: int = 0, slot: int = 1, port: int = 102) -> None:
-        self.driver = S7Driver(ip=ip, rack=rack, slot=slot, port=port)
+        self.driver = S7Driver(ip=ip, rack=rack, slot=slot, port=port, pool_size=self.pool_size)
         self.driver.connect()
-        self.logger(f"S7 connected: {ip} rack={rack} slot={slot}")
+        # blocks may grow to the PDU the PLC negotiated
+        self._read_plan = self._plan_reads(self.active_tags)
+        self.logger(
+            f"S7 connected: {ip} rack={rack} slot={slot} connections={self.driver.connection_count()}"
+        )
 
     def is_connected(self) -> bool:
         return (
@@ -55,19 +82,27 @@ class S7Service:
 
     def set_tags(self, tags: Iterable[TagSpec]) -> None:
         self.tags = list(tags)
+        self._tag_by_name = {tag.name: tag for tag in self.tags}
+        self._last_stored.clear()
+        if self.trend_buffer is not None:
+            # definitions may have changed (same name, other address): start over
+            self.trend_buffer.clear()
         self.active_tags = list(self.tags)
+        self._read_plan = self._plan_reads(self.active_tags)
         self.storage.upsert_tags(self.tags)
+        self._tags_dirty = True
         if self.state:
             with self.state.lock:
                 self.state.latest_tags = {tag.name: 0.0 for tag in self.tags}
 
     def set_active_tags(self, tag_names: Iterable[str]) -> None:
-        selected = []
-        selected_set = set(tag_names)
-        for tag in self.tags:
-            if tag.name in selected_set:
-                selected.append(tag)
+        by_name = self._tag_by_name
+        selected = [by_name[name] for name in dict.fromkeys(tag_names) if name in by_name]
         self.active_tags = selected
+        self._read_plan = self._plan_reads(selected)
+        self._last_stored.clear()
+        if self.trend_buffer is not None:
+            self.trend_buffer.retain(tag.name for tag in selected)
         if self.state:
             with self.state.lock:
                 self.state.latest_tags = {tag.name: 0.0 for tag in self.active_tags}
@@ -80,19 +115,21 @@ class S7Service:
         self._stop_event.clear()
         self._thread = threading.Thread(target=self._poll_loop, daemon=True)
         self._thread.start()
+        if self.retention_s:
+            self.storage.start_retention(self.retention_s, self.prune_interval_s, logger=self.logger)
 
     def stop_polling(self) -> None:
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=2)
+        self.storage.flush_samples()
 
     def read_once(self) -> dict:
-        values = {}
         if not self.driver:
             raise RuntimeError("S7 driver is not connected")
-        for tag in self.active_tags:
-            values[tag.name] = self.driver.read_tag(tag)
-        return values
+        if not self._read_plan:
+            return {}
+        return self.driver.read_blocks(self._read_plan)
 
     def write_tag(self, tag_name: str, value) -> None:
         if not self.driver:
@@ -100,34 +137,70 @@ class S7Service:
         tag = self._find_tag(tag_name)
         self.driver.write_tag(tag, value)
         ts = time.time()
-        self.storage.insert_sample(tag.name, float(value), ts)
+        self.storage.enqueue_sample(tag.name, float(value), ts)
+        self._last_stored[tag.name] = (float(value), ts)
+        if self.trend_buffer is not None:
+            self.trend_buffer.append(tag.name, ts, float(value))
         if self.state:
             with self.state.lock:
                 self.state.latest_tags[tag.name] = float(value)
 
     def _poll_loop(self) -> None:
+        # Fixed-rate schedule: the period does not stretch by the time spent
+        # polling; if a cycle overruns, the schedule restarts from now.
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
             try:
                 values = self.read_once()
                 ts = time.time()
-                samples = []
-                for name, value in values.items():
-                    samples.append((name, ts, float(value)))
-                self.storage.insert_samples(samples)
+                if self.trend_buffer is not None:
+                    self.trend_buffer.append_values(values, ts)
+                samples = self._changed_samples(values, ts)
+                if samples:
+                    self.storage.enqueue_samples(samples)
                 if self.state:
                     with self.state.lock:
                         self.state.latest_tags.update({k: float(v) for k, v in values.items()})
-                if self.state:
+                if self.state and self._tags_dirty:
+                    self._tags_dirty = False
                     self.state.refresh_tags(self.storage.list_tags())
                 self._last_ok_ts = ts
             except Exception as exc:  # pragma: no cover - runtime integration
                 self.logger(f"S7 poll error: {type(exc).__name__}: {exc}")
             if self._last_ok_ts and time.time() - self._last_ok_ts > 10:
                 self.logger("S7 poll warning: no new data for 10s")
-            time.sleep(self.poll_interval)
+            deadline += self.poll_interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                deadline = time.monotonic()
+
+    def _plan_reads(self, tags: List[TagSpec]) -> List[ReadBlock]:
+        driver = getattr(self, "driver", None)
+        if driver is None:
+            return plan_reads(tags)
+        return plan_reads(tags, max_len=driver.max_block_len())
+
+    def _changed_samples(self, values: dict, ts: float) -> List[Tuple[str, float, float]]:
+        samples = []
+        last_stored = self._last_stored
+        by_name = self._tag_by_name
+        for name, value in values.items():
+            v = float(value)
+            prev = last_stored.get(name)
+            if prev is not None and ts - prev[1] < self.heartbeat_s:
+                tag = by_name.get(name)
+                deadband = tag.deadband if tag else 0.0
+                # NaN compares False here, so transitions to/from NaN are stored
+                if abs(v - prev[0]) <= deadband:
+                    continue
+            samples.append((name, ts, v))
+            last_stored[name] = (v, ts)
+        return samples
 
     def _find_tag(self, tag_name: str) -> TagSpec:
-        for tag in self.tags:
-            if tag.name == tag_name:
-                return tag
-        raise KeyError(f"Tag '{tag_name}' not found")
+        try:
+            return self._tag_by_name[tag_name]
+        except KeyError:
+            raise KeyError(f"Tag '{tag_name}' not found") from None
@@ -1,7 +1,8 @@
 from __future__ import annotations
+from collections import deque
 from dataclasses import dataclass, field
 from threading import Lock
-from typing import Dict, List, Set, Tuple
+from typing import Deque, Dict, FrozenSet, List, Tuple
 
 
 @dataclass
@@ -19,15 +20,22 @@ class AppState:
     # Widgets state
     global_trend_tag: str = ""
     trend_map: Dict[str, str] = field(default_factory=dict)
-    trend_series: Dict[str, Tuple[List[float], List[float]]] = field(default_factory=dict)
+    trend_series: Dict[str, Tuple[Deque[float], Deque[float]]] = field(default_factory=dict)
     value_map: Dict[str, str] = field(default_factory=dict)
 
-    monitored_tags: Set[str] = field(default_factory=set)
+    # replaced as a whole (never mutated) so readers can use it without the lock
+    monitored_tags: FrozenSet[str] = frozenset()
 
     @staticmethod
     def max_points() -> int:
         return 600
 
+    @classmethod
+    def new_series(cls) -> Tuple[Deque[float], Deque[float]]:
+        # bounded (xs, ys): appending past max_points() drops the oldest point in O(1)
+        n = cls.max_points()
+        return deque(maxlen=n), deque(maxlen=n)
+
     def refresh_tags(self, tags: List[str]) -> None:
         with self.lock:
             self.available_tags = tags
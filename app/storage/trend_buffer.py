@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+# First allocation per tag; arrays then double up to 2*capacity
+_INITIAL_SIZE = 256
+
+
+class _Series:
+    # SoA storage: ts and values live in separate float64 arrays. They start
+    # small and double on demand up to 2*capacity; from then on, when they fill
+    # up the newest `capacity` samples are moved to the front, so [0:head] is
+    # always contiguous and sorted by ts (amortised O(1) append, no wraparound).
+    __slots__ = ("ts", "val", "head", "start")
+
+    def __init__(self, size: int, start: float) -> None:
+        self.ts = np.empty(size, dtype=np.float64)
+        self.val = np.empty(size, dtype=np.float64)
+        self.head = 0
+        self.start = start  # buffer holds every sample of the tag since this ts
+
+    def grow(self, size: int) -> None:
+        head = self.head
+        ts = np.empty(size, dtype=np.float64)
+        val = np.empty(size, dtype=np.float64)
+        ts[:head] = self.ts[:head]
+        val[:head] = self.val[:head]
+        self.ts = ts
+        self.val = val
+
+
+class TrendBuffer:
+    """Последние значения тегов в памяти для трендов (без запросов к SQLite).
+
+    A window is served from memory if the buffer covers it completely, or if
+    the buffer already holds `limit` samples inside it (the newest `limit`
+    samples are all a trend shows); otherwise window() returns None and the
+    caller reads the database. So capacity = the trend's max points is enough.
+
+    The buffer gets every polled value, while SQLite only stores samples that
+    pass the tag's deadband/heartbeat filter (S7Service). A window served from
+    SQLite can therefore look coarser than the same window served from memory.
+
+    Memory per tag grows with use: arrays start at a few KiB and double up to
+    2*capacity samples (2 float64 arrays of 2*capacity). Series of tags that
+    are no longer polled are dropped with retain()/clear().
+
+    Late samples (ts older than the newest one, e.g. a write between two polls)
+    are inserted in ts order; samples older than the buffer's start are dropped,
+    SQLite still has them.
+    """
+
+    def __init__(self, capacity: int = 65536) -> None:
+        self.capacity = int(capacity)
+        self._series: Dict[str, _Series] = {}
+        self._lock = threading.Lock()
+
+    def append(self, tag_name: str, ts: float, value: float) -> None:
+        with self._lock:
+            self._append(tag_name, ts, value)
+
+    def append_values(self, values: Mapping[str, float], ts: float) -> None:
+        """Append one poll cycle: {tag: value} sampled at ts."""
+        with self._lock:
+            for tag_name, value in values.items():
+                self._append(tag_name, ts, value)
+
+    def extend(self, samples: Iterable[Tuple[str, float, float]]) -> None:
+        with self._lock:
+            for tag_name, ts, value in samples:
+                self._append(tag_name, ts, value)
+
+    def _append(self, tag_name: str, ts: float, value: float) -> None:
+        series = self._series.get(tag_name)
+        if series is None:
+            series = self._series[tag_name] = _Series(min(_INITIAL_SIZE, 2 * self.capacity), ts)
+        if ts < series.start:
+            return  # older than what the buffer claims to hold completely
+        head = series.head
+        size = series.ts.shape[0]
+        if head == size and size < 2 * self.capacity:
+            series.grow(min(2 * size, 2 * self.capacity))
+        elif head == size:
+            keep = self.capacity
+            series.ts[:keep] = series.ts[head - keep:head]
+            series.val[:keep] = series.val[head - keep:head]
+            series.start = float(series.ts[0])
+            head = keep
+            if ts < series.start:
+                series.head = head
+                return
+        pos = head
+        if head and ts < series.ts[head - 1]:
+            # late sample: shift the newer ones right to keep [0:head] sorted
+            pos = int(np.searchsorted(series.ts[:head], ts, side="right"))
+            series.ts[pos + 1:head + 1] = series.ts[pos:head]
+            series.val[pos + 1:head + 1] = series.val[pos:head]
+        series.ts[pos] = ts
+        series.val[pos] = value
+        series.head = head + 1
+
+    def covers(self, tag_name: str, since_ts: float) -> bool:
+        series = self._series.get(tag_name)
+        return series is not None and since_ts >= series.start
+
+    def window(self, tag_name: str, since_ts: float, limit: int = 1000) -> Optional[np.ndarray]:
+        """Newest `limit` samples with ts >= since_ts as an (n, 2) array, or None if not covered."""
+        with self._lock:
+            series = self._series.get(tag_name)
+            if series is None:
+                return None
+            head = series.head
+            if since_ts < series.start and head < limit:
+                return None  # window reaches past the buffer and needs older samples
+            lo = int(np.searchsorted(series.ts[:head], since_ts))
+            lo = max(lo, head - limit)
+            out = np.empty((head - lo, 2), dtype=np.float64)
+            out[:, 0] = series.ts[lo:head]
+            out[:, 1] = series.val[lo:head]
+        return out
+
+    def retain(self, tag_names: Iterable[str]) -> None:
+        """Drop the series of every tag not in tag_names."""
+        keep = set(tag_names)
+        with self._lock:
+            for name in [name for name in self._series if name not in keep]:
+                del self._series[name]
+
+    def clear(self, tag_name: Optional[str] = None) -> None:
+        with self._lock:
+            if tag_name is None:
+                self._series.clear()
+            else:
+                self._series.pop(tag_name, None)
@@ -1,31 +1,111 @@
 from __future__ import annotations
 
 import sqlite3
+import sys
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import asdict
+from itertools import chain, groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from app.drivers.s7_driver import TagSpec
 
 
 class WorkspaceStorage:
-    def __init__(self, db_path: str):
+    # Statement texts are kept constant so sqlite3's statement cache reuses
+    # the prepared statements instead of re-parsing them on every call.
+    _SQL_UPSERT_TAG = """
+        INSERT INTO tags (name, area, db, byte_index, bit_index, data_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            area=excluded.area,
+            db=excluded.db,
+            byte_index=excluded.byte_index,
+            bit_index=excluded.bit_index,
+            data_type=excluded.data_type
+    """
+    _SQL_LIST_TAGS = "SELECT name FROM tags ORDER BY name"
+    _SQL_INSERT_SAMPLE = "INSERT INTO samples (tag_name, ts, value) VALUES (?, ?, ?)"
+    # No tag filter: samples of removed/renamed tags must age out too.
+    # Seeks idx_samples_ts; deleted in batches so each write transaction stays short.
+    _SQL_PRUNE = "DELETE FROM samples WHERE id IN (SELECT id FROM samples WHERE ts < ? LIMIT ?)"
+    PRUNE_BATCH = 10000
+    _SQL_GET_SERIES = """
+        SELECT ts, value
+        FROM samples
+        WHERE tag_name = ? AND ts >= ?
+        ORDER BY ts DESC
+        LIMIT ?
+    """
+    # One per-tag index seek; get_series_multi glues several with UNION ALL
+    _SQL_SERIES_PART = """
+        SELECT * FROM (
+            SELECT tag_name, ts, value
+            FROM samples
+            WHERE tag_name = ? AND ts >= ?
+            ORDER BY ts DESC
+            LIMIT ?
+        )
+    """
+
+    def __init__(self, db_path: str, flush_rows: int = 100, flush_interval: float = 0.5):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        # Autocommit connection: writes open their own BEGIN/COMMIT (see _transaction),
+        # reads never sit inside an implicit transaction that blocks WAL checkpoints.
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=256, isolation_level=None
+        )
+        self._local = threading.local()  # one cursor per thread
+        self._write_lock = threading.RLock()
         self._configure()
         self._create_tables()
 
+        # Buffered sample writes: flushed as one transaction once flush_rows
+        # rows are pending or flush_interval seconds after the oldest one.
+        self.flush_rows = int(flush_rows)
+        self.flush_interval = float(flush_interval)
+        self._pending: deque = deque()
+        self._pending_since: Optional[float] = None
+        self._pending_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._retention: Optional[threading.Thread] = None
+
+    def _cursor(self) -> sqlite3.Cursor:
+        cur = getattr(self._local, "cur", None)
+        if cur is None:
+            cur = self._local.cur = self.conn.cursor()
+        return cur
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        with self._write_lock:
+            cur = self._cursor()
+            cur.execute("BEGIN")
+            try:
+                yield cur
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+
     def _configure(self) -> None:
-        with self.conn:
-            self.conn.execute("PRAGMA journal_mode=WAL")
-            self.conn.execute("PRAGMA synchronous=NORMAL")
+        cur = self._cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")
 
     def _create_tables(self) -> None:
-        with self.conn:
-            self.conn.execute(
+        with self._transaction() as cur:
+            cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS tags (
                     name TEXT PRIMARY KEY,
@@ -37,7 +117,7 @@ class WorkspaceStorage:
                 )
                 """
             )
-            self.conn.execute(
+            cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS samples (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,7 +127,13 @@ class WorkspaceStorage:
                 )
                 """
             )
-            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_tag_ts ON samples(tag_name, ts)")
+            # Covering index: latest-value and series lookups never touch the table rows.
+            cur.execute("DROP INDEX IF EXISTS idx_samples_tag_ts")
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_samples_tag_ts_value ON samples(tag_name, ts, value)"
+            )
+            # Retention deletes by age across all tags
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples(ts)")
 
     def upsert_tags(self, tags: Iterable[TagSpec]) -> None:
         rows = []
@@ -63,63 +149,207 @@ class WorkspaceStorage:
                     payload["data_type"],
                 )
             )
-        with self.conn:
-            self.conn.executemany(
-                """
-                INSERT INTO tags (name, area, db, byte_index, bit_index, data_type)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(name) DO UPDATE SET
-                    area=excluded.area,
-                    db=excluded.db,
-                    byte_index=excluded.byte_index,
-                    bit_index=excluded.bit_index,
-                    data_type=excluded.data_type
-                """,
-                rows,
-            )
+        with self._transaction() as cur:
+            cur.executemany(self._SQL_UPSERT_TAG, rows)
 
     def list_tags(self) -> List[str]:
-        cur = self.conn.execute("SELECT name FROM tags ORDER BY name")
-        return [row["name"] for row in cur.fetchall()]
+        rows = self._cursor().execute(self._SQL_LIST_TAGS).fetchall()
+        return [sys.intern(row[0]) for row in rows]
 
     def insert_samples(self, samples: Iterable[Tuple[str, float, float]]) -> None:
-        with self.conn:
-            self.conn.executemany(
-                "INSERT INTO samples (tag_name, ts, value) VALUES (?, ?, ?)",
-                samples,
-            )
+        with self._transaction() as cur:
+            cur.executemany(self._SQL_INSERT_SAMPLE, samples)
 
     def insert_sample(self, tag_name: str, value: float, ts: Optional[float] = None) -> None:
         if ts is None:
             ts = time.time()
-        self.insert_samples([(tag_name, ts, float(value))])
+        with self._transaction() as cur:
+            cur.execute(self._SQL_INSERT_SAMPLE, (tag_name, ts, float(value)))
+
+    def enqueue_sample(self, tag_name: str, value: float, ts: Optional[float] = None) -> None:
+        if ts is None:
+            ts = time.time()
+        self.enqueue_samples([(tag_name, ts, float(value))])
+
+    def enqueue_samples(self, samples: Iterable[Tuple[str, float, float]]) -> None:
+        with self._pending_lock:
+            self._pending.extend(samples)
+            if self._pending and self._pending_since is None:
+                self._pending_since = time.monotonic()
+            full = len(self._pending) >= self.flush_rows
+        if full:
+            self.flush_samples()
+        else:
+            self._ensure_flusher()
+
+    def flush_samples(self) -> int:
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = self._pending, deque()
+            self._pending_since = None
+        self.insert_samples(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flusher:
+            self._flusher.join(timeout=2)
+        if self._retention:
+            self._retention.join(timeout=2)
+        self.flush_samples()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher and self._flusher.is_alive():
+            return
+        if self._closed.is_set():
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._pending_lock:
+                since = self._pending_since
+            if since is None:
+                timeout = self.flush_interval
+            else:
+                timeout = max(0.0, since + self.flush_interval - time.monotonic())
+            if self._closed.wait(timeout):
+                break
+            with self._pending_lock:
+                since = self._pending_since
+            if since is not None and time.monotonic() - since >= self.flush_interval:
+                try:
+                    self.flush_samples()
+                except Exception:  # pragma: no cover - runtime integration
+                    pass
+
+    def prune(self, older_than_s: float) -> int:
+        """Delete samples older than `older_than_s` seconds; returns the number of rows removed.
+
+        Runs in PRUNE_BATCH-row transactions, so sample flushes can interleave.
+        """
+        cutoff = time.time() - float(older_than_s)
+        removed = 0
+        while not self._closed.is_set():
+            with self._transaction() as cur:
+                cur.execute(self._SQL_PRUNE, (cutoff, self.PRUNE_BATCH))
+                n = cur.rowcount
+            removed += n
+            if n < self.PRUNE_BATCH:
+                break
+        return removed
+
+    def maintenance(self) -> None:
+        """Refresh planner stats and shrink the WAL file (occasional, see start_retention)."""
+        with self._write_lock:
+            cur = self._cursor()
+            cur.execute("PRAGMA optimize")
+            cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def start_retention(
+        self,
+        older_than_s: float,
+        interval_s: float = 3600.0,
+        maintenance_s: float = 24 * 3600.0,
+        logger: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """
+        Prune samples older than `older_than_s` in a background thread: once at
+        start, then every `interval_s` seconds; maintenance() every `maintenance_s`.
+        Stops on close(). Calling it again while running does nothing.
+        """
+        if self._retention and self._retention.is_alive():
+            return
+        if self._closed.is_set():
+            return
+        log = logger or (lambda msg: None)
+
+        def loop() -> None:
+            last_maintenance = time.monotonic()
+            while True:
+                try:
+                    removed = self.prune(older_than_s)
+                    if removed:
+                        log(f"Retention: removed {removed} samples older than {older_than_s:.0f}s")
+                    if time.monotonic() - last_maintenance >= maintenance_s:
+                        last_maintenance = time.monotonic()
+                        self.maintenance()
+                except Exception as exc:  # pragma: no cover - runtime integration
+                    log(f"Retention error: {type(exc).__name__}: {exc}")
+                if self._closed.wait(interval_s):
+                    break
+
+        self._retention = threading.Thread(target=loop, daemon=True)
+        self._retention.start()
 
     def get_latest_values(self, tag_names: Optional[List[str]] = None) -> dict:
-        params = []
-        where = ""
+        # One index seek per tag (newest entry of idx_samples_tag_ts_value)
+        # instead of grouping the whole samples table.
+        params: List[str] = []
+        # Every tag that has samples (same set as the old GROUP BY, including tags
+        # already removed from `tags`), walked as DISTINCT via one seek per name
+        names_sql = """
+            SELECT MIN(tag_name) FROM samples
+            UNION ALL
+            SELECT (SELECT MIN(tag_name) FROM samples WHERE tag_name > names.tag_name)
+            FROM names WHERE tag_name IS NOT NULL
+        """
         if tag_names:
-            placeholders = ",".join(["?"] * len(tag_names))
-            where = f"WHERE tag_name IN ({placeholders})"
+            names_sql = "VALUES " + ",".join(["(?)"] * len(tag_names))
             params.extend(tag_names)
         query = f"""
-            SELECT tag_name, value, MAX(ts) as ts
-            FROM samples
-            {where}
-            GROUP BY tag_name
+            WITH RECURSIVE names(tag_name) AS ({names_sql})
+            SELECT tag_name, value FROM (
+                SELECT
+                    n.tag_name AS tag_name,
+                    (
+                        SELECT s.value FROM samples s
+                        WHERE s.tag_name = n.tag_name
+                        ORDER BY s.ts DESC
+                        LIMIT 1
+                    ) AS value
+                FROM names n
+            )
+            WHERE value IS NOT NULL
         """
-        cur = self.conn.execute(query, params)
-        return {row["tag_name"]: row["value"] for row in cur.fetchall()}
+        rows = self._cursor().execute(query, params).fetchall()
+        return {name: value for name, value in rows}
 
     def get_series(self, tag_name: str, since_ts: float, limit: int = 500) -> List[Tuple[float, float]]:
-        cur = self.conn.execute(
-            """
-            SELECT ts, value
-            FROM samples
-            WHERE tag_name = ? AND ts >= ?
-            ORDER BY ts DESC
-            LIMIT ?
-            """,
-            (tag_name, since_ts, limit),
-        )
-        rows = cur.fetchall()
-        return [(row["ts"], row["value"]) for row in reversed(rows)]
+        rows = self._cursor().execute(self._SQL_GET_SERIES, (tag_name, since_ts, limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    def get_series_np(self, tag_name: str, since_ts: float, limit: int = 500) -> np.ndarray:
+        """Same rows as get_series, as a float64 array of shape (n, 2): [:, 0] = ts, [:, 1] = value."""
+        rows = self._cursor().execute(self._SQL_GET_SERIES, (tag_name, since_ts, limit)).fetchall()
+        n = len(rows)
+        arr = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=2 * n).reshape(n, 2)
+        return arr[::-1].copy()  # query is newest-first
+
+    def get_series_multi(
+        self, pairs: Iterable[Tuple[str, float]], limit: int = 500
+    ) -> Dict[str, np.ndarray]:
+        """Fetch several series in one query: {tag: (n, 2) array as in get_series_np}.
+
+        A tag requested several times is read once from the earliest since_ts;
+        callers slice narrower windows out of it.
+        """
+        since_by_tag: Dict[str, float] = {}
+        for tag_name, since_ts in pairs:
+            prev = since_by_tag.get(tag_name)
+            if prev is None or since_ts < prev:
+                since_by_tag[tag_name] = since_ts
+        if not since_by_tag:
+            return {}
+        query = " UNION ALL ".join([self._SQL_SERIES_PART] * len(since_by_tag)) + " ORDER BY tag_name, ts"
+        params: List[object] = []
+        for tag_name, since_ts in since_by_tag.items():
+            params.extend((tag_name, since_ts, limit))
+        rows = self._cursor().execute(query, params).fetchall()
+        result = {name: np.empty((0, 2), dtype=np.float64) for name in since_by_tag}
+        for name, group in groupby(rows, key=itemgetter(0)):
+            result[name] = np.array([row[1:] for row in group], dtype=np.float64)
+        return result
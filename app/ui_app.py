@@ -7,22 +7,34 @@ import site
 import traceback
 import threading
 import time
-from collections import deque
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import List
+from queue import Empty, SimpleQueue
+from typing import List, Optional
 
 from tkinter import filedialog
 import dearpygui.dearpygui as dpg
-
-from app.config import APP_TITLE, VIEWPORT_W, VIEWPORT_H, FONT_SIZE, DB_PATH, S7_POLL_INTERVAL
+import numpy as np
+
+from app.config import (
+    APP_TITLE,
+    VIEWPORT_W,
+    VIEWPORT_H,
+    FONT_SIZE,
+    DB_PATH,
+    S7_POLL_INTERVAL,
+    SAMPLE_RETENTION_SEC,
+)
 from app.state import AppState
+from app.core.batch import LEVEL_POST, LEVEL_READ, LEVEL_WRITE, LeveledBatch
 from app.core.logger import UILogger
 from app.services.scan_service import ScanService
 from app.services.s7_service import S7Service
+from app.storage.trend_buffer import TrendBuffer
 from app.storage.workspace import WorkspaceStorage
 from app.drivers.s7_driver import (
-    TagSpec,
+    parse_tags_csv,
     SNAP7_AVAILABLE,
     SNAP7_IMPORT_ERROR,
     SNAP7_IMPORT_TRACEBACK,
@@ -30,6 +42,12 @@ from app.drivers.s7_driver import (
 )
 
 
+# Bound once: the trend/tag refresh paths call these for every widget on every tick
+_get_value = dpg.get_value
+_set_value = dpg.set_value
+_set_axis_limits = dpg.set_axis_limits
+_configure_item = dpg.configure_item
+
 # ---------------------------
 # Global objects
 # ---------------------------
@@ -39,13 +57,30 @@ log = UILogger()
 scan_service = ScanService()
 PORTS_TO_SCAN = [102, 4840, 1102]
 
+TREND_MAX_POINTS = 1000
+
 storage = WorkspaceStorage(DB_PATH)
-s7_service = S7Service(storage=storage, poll_interval=S7_POLL_INTERVAL, state=state, logger=log.log)
+# Trends show at most TREND_MAX_POINTS samples, so that is all the buffer keeps per tag
+trend_buffer = TrendBuffer(capacity=TREND_MAX_POINTS)
+s7_service = S7Service(
+    storage=storage,
+    poll_interval=S7_POLL_INTERVAL,
+    state=state,
+    logger=log.log,
+    retention_s=SAMPLE_RETENTION_SEC,
+    trend_buffer=trend_buffer,
+)
 
 # UI thread task queue (because dpg.invoke may not exist)
-UI_QUEUE = deque()
+UI_QUEUE: SimpleQueue = SimpleQueue()
+UI_PUMP_BUDGET = 0.004  # seconds of queued UI work per frame
+# Widget construction grouped per frame: reads, then dpg.add_*, then registration
+ui_batch = LeveledBatch(on_error=lambda e: log.log(f"UI batch error: {e}"))
 
 TAG_LIST_PARENT = "tags_list"
+TAG_LIST_EMPTY_TAG = "tags_list_empty"
+SCAN_RESULTS_TAG = "scan_results"
+SCAN_EMPTY_TAG = "scan_results_empty"
 TREND_SERIES_TAG = "trend_series"
 TREND_TAG_COMBO = "trend_tag_combo"
 TREND_MODE_TAG = "trend_mode"
@@ -56,23 +91,42 @@ CONNECT_RACK_TAG = "connect_rack"
 CONNECT_SLOT_TAG = "connect_slot"
 CONNECT_PORT_TAG = "connect_port"
 
-trend_last_update = 0.0
+# Main trend uses the same keys as the extra trend windows (minus the y-axis limits)
+MAIN_TREND = {
+    "tag": TREND_TAG_COMBO,
+    "window": TREND_WINDOW_TAG,
+    "pause": TREND_PAUSE_TAG,
+    "series": TREND_SERIES_TAG,
+    "alive": True,
+}
 trend_windows = {}
+# Immutable copy of trend_windows.values(), swapped on every change; the trend
+# scheduler thread iterates it without copying or locking.
+trend_windows_snapshot: tuple = ()
+_TREND_UI_READY = False  # set once _build_layout() has created the main trend widgets
+# Rendered list rows, kept between renders so only the delta is added/removed
+scan_rows = {}  # ip -> (selectable tag, popup tag, label)
+tag_rows = {}  # tag name -> (group id, text id, text)
+rendered_tag_names: List[str] = []
 trend_window_counter = 0
 tags_last_refresh = 0.0
 
 
 def ui_post(fn):
     """Schedule a function to run on the main UI thread."""
-    UI_QUEUE.append(fn)
+    UI_QUEUE.put(fn)
 
 
 def _ui_pump():
-    # Run up to N tasks per frame to keep UI responsive
-    for _ in range(50):
-        if not UI_QUEUE:
+    # Run queued tasks until the per-frame time budget is spent
+    get = UI_QUEUE.get_nowait
+    clock = time.perf_counter
+    deadline = clock() + UI_PUMP_BUDGET
+    while clock() < deadline:
+        try:
+            fn = get()
+        except Empty:
             break
-        fn = UI_QUEUE.popleft()
         try:
             fn()
         except Exception as e:
@@ -81,8 +135,8 @@ def _ui_pump():
 
 def _frame_cb(sender=None, app_data=None):
     _ui_pump()
-    _refresh_trend()
-    _refresh_trend_windows()
+    ui_batch.flush()
+    log.flush()
     _refresh_tags_view()
     # re-schedule next frame
     dpg.set_frame_callback(dpg.get_frame_count() + 1, _frame_cb)
@@ -114,50 +168,82 @@ def _safe_tag_from_ip(ip: str) -> str:
     return "host_" + ip.replace(".", "_").replace(":", "_")
 
 
+# Row callbacks are shared; the IP / tag name comes in as user_data
+def _cb_select_ip(sender, app_data, user_data):
+    if dpg.does_item_exist(SELECTED_IP_TAG):
+        dpg.set_value(SELECTED_IP_TAG, user_data)
+    else:
+        log.log("UI warning: selected_ip field not found.")
+    log.set_status(f"Выбран: {user_data}")
+    log.log(f"Selected IP: {user_data}")
+
+
+def _cb_connect(sender, app_data, user_data):
+    connect_controller(user_data)
+
+
+def _cb_load_tags(sender, app_data, user_data):
+    load_tags_from_controller(user_data)
+
+
+def _cb_disconnect(sender, app_data, user_data):
+    disconnect_controller(user_data)
+
+
+def _cb_add_monitor(sender, app_data, user_data):
+    add_monitor_tag(user_data)
+
+
+def _cb_remove_monitor(sender, app_data, user_data):
+    remove_monitor_tag(user_data)
+
+
+def _cb_set_trend(sender, app_data, user_data):
+    set_trend_tag(user_data)
+
+
 def _render_scan_hits(hits):
-    if not dpg.does_item_exist("scan_results"):
+    if not dpg.does_item_exist(SCAN_RESULTS_TAG):
         return
 
-    dpg.delete_item("scan_results", children_only=True)
+    new_ips = {hit.ip for hit in hits}
+    for ip in [ip for ip in scan_rows if ip not in new_ips]:
+        item, popup, _ = scan_rows.pop(ip)
+        dpg.delete_item(popup)
+        dpg.delete_item(item)
 
-    if not hits:
-        dpg.add_text("Ничего не найдено.", parent="scan_results")
-        return
+    dpg.set_value(SCAN_EMPTY_TAG, "Ничего не найдено.")
+    dpg.configure_item(SCAN_EMPTY_TAG, show=not hits)
 
-    for hit in hits:
+    # hits are sorted by IP: walk backwards so new rows can be inserted before their successor
+    next_item = 0
+    for hit in reversed(hits):
         ip = hit.ip
         label = f"{ip}  ports={hit.open_ports}"
-        tag = _safe_tag_from_ip(ip)
-
-        def on_select(sender, app_data, u=ip):
-            if dpg.does_item_exist(SELECTED_IP_TAG):
-                dpg.set_value(SELECTED_IP_TAG, u)
-            else:
-                log.log("UI warning: selected_ip field not found.")
-            log.set_status(f"Выбран: {u}")
-            log.log(f"Selected IP: {u}")
+        row = scan_rows.get(ip)
+        if row is not None:
+            if row[2] != label:
+                _configure_item(row[0], label=label)
+                scan_rows[ip] = (row[0], row[1], label)
+            next_item = row[0]
+            continue
 
+        tag = _safe_tag_from_ip(ip)
         dpg.add_selectable(
             label=label,
-            parent="scan_results",
+            parent=SCAN_RESULTS_TAG,
             tag=tag,
             user_data=ip,
-            callback=on_select,
+            callback=_cb_select_ip,
+            before=next_item,
         )
 
-        with dpg.popup(tag, mousebutton=dpg.mvMouseButton_Right):
-            dpg.add_menu_item(
-                label="Подключиться",
-                callback=lambda s, a, u=ip: connect_controller(u),
-            )
-            dpg.add_menu_item(
-                label="Выгрузить данные",
-                callback=lambda s, a, u=ip: load_tags_from_controller(u),
-            )
-            dpg.add_menu_item(
-                label="Отключиться",
-                callback=lambda s, a, u=ip: disconnect_controller(u),
-            )
+        with dpg.popup(tag, mousebutton=dpg.mvMouseButton_Right) as popup:
+            dpg.add_menu_item(label="Подключиться", user_data=ip, callback=_cb_connect)
+            dpg.add_menu_item(label="Выгрузить данные", user_data=ip, callback=_cb_load_tags)
+            dpg.add_menu_item(label="Отключиться", user_data=ip, callback=_cb_disconnect)
+        scan_rows[ip] = (tag, popup, label)
+        next_item = tag
 
 
 def scan_clicked():
@@ -251,7 +337,7 @@ def show_tag_import_dialog():
         dpg.delete_item(tag)
 
     with dpg.window(label="Импорт тегов", modal=True, width=760, height=520, tag=tag):
-        dpg.add_text("Введите список тегов (CSV: name,area,db,byte_index,data_type,bit_index)")
+        dpg.add_text("Введите список тегов (CSV: name,area,db,byte_index,data_type,bit_index[,deadband])")
         dpg.add_input_text(tag="tags_import_text", multiline=True, height=360, width=-1)
 
         with dpg.group(horizontal=True):
@@ -279,42 +365,11 @@ def _fill_tag_example():
 
 def import_tags_from_text():
     text = dpg.get_value("tags_import_text") or ""
-    tags = []
-    errors = []
-    for idx, line in enumerate(text.splitlines(), start=1):
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) < 5:
-            errors.append(f"Строка {idx}: недостаточно полей")
-            continue
-        if idx == 1 and parts[0].lower() == "name" and parts[1].lower() == "area":
-            continue
-        try:
-            name = parts[0]
-            area = parts[1]
-            db = int(parts[2])
-            byte_index = int(parts[3])
-            data_type = parts[4]
-            bit_index = int(parts[5]) if len(parts) > 5 and parts[5] else None
-        except ValueError as exc:
-            errors.append(f"Строка {idx}: ошибка преобразования ({exc})")
-            continue
-        tags.append(
-            TagSpec(
-                name=name,
-                area=area,
-                db=db,
-                byte_index=byte_index,
-                data_type=data_type,
-                bit_index=bit_index,
-            )
-        )
+    tags, errors = parse_tags_csv(text)
     if tags:
         s7_service.set_tags(tags)
         state.refresh_tags(storage.list_tags())
-        _render_tags()
+        ui_batch.add(LEVEL_WRITE, _render_tags, key="render_tags")
         log.set_status(f"Импортировано тегов: {len(tags)}")
     else:
         log.set_status("Не удалось импортировать теги. Проверьте формат CSV.")
@@ -342,26 +397,42 @@ def import_tags_from_csv():
 
 
 def _render_tags():
+    global rendered_tag_names
     if not dpg.does_item_exist(TAG_LIST_PARENT):
         return
-    dpg.delete_item(TAG_LIST_PARENT, children_only=True)
     tags = storage.list_tags()
-    if not tags:
-        dpg.add_text("Теги не загружены.", parent=TAG_LIST_PARENT)
-        return
-    if dpg.does_item_exist(TREND_TAG_COMBO):
-        dpg.configure_item(TREND_TAG_COMBO, items=tags)
-    for window in trend_windows.values():
-        if dpg.does_item_exist(window["tag"]):
-            dpg.configure_item(window["tag"], items=tags)
+    dpg.configure_item(TAG_LIST_EMPTY_TAG, show=not tags)
+    if tags != rendered_tag_names:
+        if dpg.does_item_exist(TREND_TAG_COMBO):
+            dpg.configure_item(TREND_TAG_COMBO, items=tags)
+        for window in trend_windows_snapshot:
+            if window["alive"]:
+                dpg.configure_item(window["tag"], items=tags)
+        current = set(tags)
+        for name in [name for name in tag_rows if name not in current]:
+            dpg.delete_item(tag_rows.pop(name)[0])
+        rendered_tag_names = tags
+
     latest_values = dict(state.latest_tags) if state.latest_tags else {}
-    for tag in tags:
+    # tags come sorted by name: walk backwards so new rows land before their successor
+    next_item = 0
+    for tag in reversed(tags):
         value_text = f" = {latest_values[tag]:.3f}" if tag in latest_values else ""
-        with dpg.group(horizontal=True, parent=TAG_LIST_PARENT):
-            dpg.add_text(f"{tag}{value_text}")
-            dpg.add_button(label="Добавить в монитор", callback=lambda s, a, t=tag: add_monitor_tag(t))
-            dpg.add_button(label="Удалить слежение", callback=lambda s, a, t=tag: remove_monitor_tag(t))
-            dpg.add_button(label="Построить тренд", callback=lambda s, a, t=tag: set_trend_tag(t))
+        text = f"{tag}{value_text}"
+        row = tag_rows.get(tag)
+        if row is not None:
+            if row[2] != text:
+                _set_value(row[1], text)
+                tag_rows[tag] = (row[0], row[1], text)
+            next_item = row[0]
+            continue
+        with dpg.group(horizontal=True, parent=TAG_LIST_PARENT, before=next_item) as group:
+            text_id = dpg.add_text(text)
+            dpg.add_button(label="Добавить в монитор", user_data=tag, callback=_cb_add_monitor)
+            dpg.add_button(label="Удалить слежение", user_data=tag, callback=_cb_remove_monitor)
+            dpg.add_button(label="Построить тренд", user_data=tag, callback=_cb_set_trend)
+        tag_rows[tag] = (group, text_id, text)
+        next_item = group
 
 
 def _refresh_tags_view():
@@ -379,17 +450,18 @@ def add_monitor_tag(tag: str):
     if not s7_service.is_connected():
         log.set_status("Нет подключения к S7. Подключитесь к контроллеру.")
         return
-    state.monitored_tags.add(tag)
-    s7_service.set_active_tags(state.monitored_tags)
+    monitored = state.monitored_tags | {tag}
+    state.monitored_tags = monitored
+    s7_service.set_active_tags(monitored)
     s7_service.start_polling()
     log.set_status(f"Мониторинг: {tag}")
 
 
 def remove_monitor_tag(tag: str):
-    if tag in state.monitored_tags:
-        state.monitored_tags.remove(tag)
-    s7_service.set_active_tags(state.monitored_tags)
-    if not state.monitored_tags:
+    monitored = state.monitored_tags - {tag}
+    state.monitored_tags = monitored
+    s7_service.set_active_tags(monitored)
+    if not monitored:
         s7_service.stop_polling()
     log.set_status(f"Слежение удалено: {tag}")
 
@@ -399,92 +471,213 @@ def set_trend_tag(tag: str):
     log.set_status(f"Тренд для тега: {tag}")
 
 
-def _refresh_trend():
-    global trend_last_update
-    if not dpg.does_item_exist(TREND_SERIES_TAG):
-        return
-    if not dpg.does_item_exist(TREND_PAUSE_TAG):
-        return
-    paused = dpg.get_value(TREND_PAUSE_TAG)
-    if paused:
-        return
-    now = time.time()
-    if now - trend_last_update < 1.0:
-        return
-    trend_last_update = now
-    tag = dpg.get_value(TREND_TAG_COMBO)
-    if not tag:
-        return
-    window_sec = float(dpg.get_value(TREND_WINDOW_TAG))
-    since_ts = now - window_sec
-    points = storage.get_series(tag_name=tag, since_ts=since_ts, limit=1000)
-    xs = [p[0] - since_ts for p in points]
-    ys = [p[1] for p in points]
-    dpg.set_value(TREND_SERIES_TAG, [xs, ys])
-
-
-def _refresh_trend_windows():
-    now = time.time()
-    for window_id, window in list(trend_windows.items()):
-        if not dpg.does_item_exist(window["series"]):
-            trend_windows.pop(window_id, None)
-            continue
-        if dpg.get_value(window["pause"]):
+def _trend_targets():
+    """Collect (window, tag, window_sec) for every non-paused trend; must hold dpg.mutex()."""
+    targets = []
+    windows = ((MAIN_TREND,) if _TREND_UI_READY else ()) + trend_windows_snapshot
+    for window in windows:
+        if not window["alive"]:
             continue
-        last = window.get("last_update", 0.0)
-        if now - last < 1.0:
+        if _get_value(window["pause"]):
             continue
-        window["last_update"] = now
-        tag = dpg.get_value(window["tag"])
+        tag = _get_value(window["tag"])
         if not tag:
             continue
-        window_sec = float(dpg.get_value(window["window"]))
-        since_ts = now - window_sec
-        points = storage.get_series(tag_name=tag, since_ts=since_ts, limit=1000)
-        xs = [p[0] - since_ts for p in points]
-        ys = [p[1] for p in points]
-        dpg.set_value(window["series"], [xs, ys])
-        y_min = float(dpg.get_value(window["y_min"]))
-        y_max = float(dpg.get_value(window["y_max"]))
+        targets.append((window, tag, float(_get_value(window["window"]))))
+    return targets
+
+
+def _apply_trend(window, xs, ys):
+    if not window["alive"]:
+        return
+    _set_value(window["series"], [xs, ys])
+    if "y_axis" in window:
+        y_min = float(_get_value(window["y_min"]))
+        y_max = float(_get_value(window["y_max"]))
         if y_max > y_min:
-            dpg.set_axis_limits(window["y_axis"], y_min, y_max)
+            _set_axis_limits(window["y_axis"], y_min, y_max)
+
+
+def _series_arrays(arr, since_ts):
+    # float32 arrays go to set_value as buffers (no per-point PyFloat unboxing).
+    # New arrays every tick: the posted task may run after the next tick, so
+    # the UI must never see buffers the scheduler is refilling.
+    # x is seconds since the window start, so float32 (~7 digits) still
+    # resolves ~10 ms over a 24 h window.
+    xs = np.subtract(arr[:, 0], since_ts).astype(np.float32)
+    ys = arr[:, 1].astype(np.float32)
+    return xs, ys
+
+
+class TrendScheduler:
+    """Обновляет тренды раз в interval секунд в фоновом потоке.
+
+    Series are read from storage off the UI thread; only the final
+    dpg.set_value is posted to the UI queue.
+    """
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = float(interval)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as exc:
+                log.log(f"Trend refresh error: {exc}")
+
+    def tick(self) -> None:
+        with dpg.mutex():
+            targets = _trend_targets()
+        if not targets:
+            return
+        now = time.time()
+        # Recent windows come from the in-memory buffer; older ones from SQLite in one query.
+        # The buffer holds every polled value, SQLite only deadband-filtered ones, so a
+        # window's shape can change when it falls back to get_series_multi.
+        cached = {}
+        missing = []
+        for window, tag, window_sec in targets:
+            arr = trend_buffer.window(tag, now - window_sec, limit=TREND_MAX_POINTS)
+            if arr is None:
+                missing.append((tag, now - window_sec))
+            else:
+                cached[id(window)] = arr
+        series = storage.get_series_multi(missing, limit=TREND_MAX_POINTS) if missing else {}
+        for window, tag, window_sec in targets:
+            since_ts = now - window_sec
+            arr = cached.get(id(window))
+            if arr is None:
+                arr = series[tag]
+                arr = arr[np.searchsorted(arr[:, 0], since_ts):]
+            xs, ys = _series_arrays(arr, since_ts)
+            ui_post(partial(_apply_trend, window, xs, ys))
+
+
+trend_scheduler = TrendScheduler()
 
 
 def open_trend_window():
     global trend_window_counter
     trend_window_counter += 1
-    window_id = f"trend_window_{trend_window_counter}"
-    tag_combo = f"{window_id}_tag"
-    window_input = f"{window_id}_window"
-    pause_checkbox = f"{window_id}_pause"
-    y_min = f"{window_id}_y_min"
-    y_max = f"{window_id}_y_max"
-    series_tag = f"{window_id}_series"
-    y_axis = f"{window_id}_y_axis"
-
-    with dpg.window(label=f"Тренд #{trend_window_counter}", width=520, height=360, tag=window_id):
-        with dpg.group(horizontal=True):
-            dpg.add_combo(items=state.get_tags(), width=200, tag=tag_combo, default_value="")
-            dpg.add_input_float(label="Окно, сек", default_value=300.0, width=140, tag=window_input)
-            dpg.add_checkbox(label="Пауза", default_value=False, tag=pause_checkbox)
-        with dpg.group(horizontal=True):
-            dpg.add_slider_float(label="Мин", min_value=-1000.0, max_value=1000.0, default_value=0.0, width=220, tag=y_min)
-            dpg.add_slider_float(label="Макс", min_value=-1000.0, max_value=1000.0, default_value=100.0, width=220, tag=y_max)
-        with dpg.plot(label="", height=220, width=-1):
-            dpg.add_plot_axis(dpg.mvXAxis, label="t, sec")
-            with dpg.plot_axis(dpg.mvYAxis, label="value", tag=y_axis):
-                dpg.add_line_series([], [], tag=series_tag, label="")
-
-    trend_windows[window_id] = {
-        "tag": tag_combo,
-        "window": window_input,
-        "pause": pause_checkbox,
-        "y_min": y_min,
-        "y_max": y_max,
-        "series": series_tag,
-        "y_axis": y_axis,
-        "last_update": 0.0,
+    number = trend_window_counter
+    window_id = f"trend_window_{number}"
+    window = {
+        "tag": f"{window_id}_tag",
+        "window": f"{window_id}_window",
+        "pause": f"{window_id}_pause",
+        "y_min": f"{window_id}_y_min",
+        "y_max": f"{window_id}_y_max",
+        "series": f"{window_id}_series",
+        "y_axis": f"{window_id}_y_axis",
+        "alive": True,
     }
+    ctx = {}
+
+    def read_tags():
+        ctx["tags"] = state.get_tags()
+
+    def build_widgets():
+        with dpg.window(
+            label=f"Тренд #{number}",
+            width=520,
+            height=360,
+            tag=window_id,
+            on_close=_close_trend_window,
+            user_data=window_id,
+        ):
+            with dpg.group(horizontal=True):
+                dpg.add_combo(items=ctx["tags"], width=200, tag=window["tag"], default_value="")
+                dpg.add_input_float(label="Окно, сек", default_value=300.0, width=140, tag=window["window"])
+                dpg.add_checkbox(label="Пауза", default_value=False, tag=window["pause"])
+            with dpg.group(horizontal=True):
+                dpg.add_slider_float(label="Мин", min_value=-1000.0, max_value=1000.0, default_value=0.0, width=220, tag=window["y_min"])
+                dpg.add_slider_float(label="Макс", min_value=-1000.0, max_value=1000.0, default_value=100.0, width=220, tag=window["y_max"])
+            with dpg.plot(label="", height=220, width=-1):
+                dpg.add_plot_axis(dpg.mvXAxis, label="t, sec")
+                with dpg.plot_axis(dpg.mvYAxis, label="value", tag=window["y_axis"]):
+                    dpg.add_line_series([], [], tag=window["series"], label="")
+
+    def register():
+        if dpg.does_item_exist(window_id):
+            trend_windows[window_id] = window
+            _publish_trend_windows()
+
+    ui_batch.add(LEVEL_READ, read_tags)
+    ui_batch.add(LEVEL_WRITE, build_widgets)
+    ui_batch.add(LEVEL_POST, register)
+
+
+def _publish_trend_windows():
+    global trend_windows_snapshot
+    trend_windows_snapshot = tuple(trend_windows.values())
+
+
+def _close_trend_window(sender, app_data, user_data):
+    window = trend_windows.pop(user_data, None)
+    if window is not None:
+        window["alive"] = False
+        _publish_trend_windows()
+    dpg.delete_item(user_data)
+
+
+def _thin_indices(ts: np.ndarray, step: float) -> np.ndarray:
+    """Indices of sorted ts keeping the first row and then each row >= step after the last kept one."""
+    n = ts.size
+    if n < 2 or step <= 0 or np.diff(ts).min() >= step:
+        return np.arange(n)
+    # jump straight to the next kept row instead of visiting every row
+    keep = []
+    searchsorted = ts.searchsorted
+    i = 0
+    while i < n:
+        keep.append(i)
+        last = ts[i]
+        j = int(searchsorted(last + step, side="left"))
+        # ts[j] >= last + step and ts[j] - last >= step can differ in the last bit
+        while j < n and ts[j] - last < step:
+            j += 1
+        while j > i + 1 and ts[j - 1] - last >= step:
+            j -= 1
+        i = j
+    return np.array(keep, dtype=np.intp)
+
+
+def _iso_local(ts: np.ndarray) -> np.ndarray:
+    """Local-time ISO strings for unix timestamps, like datetime.fromtimestamp(ts).isoformat()."""
+    if ts.size == 0:
+        return np.empty(0, dtype=str)
+    # One UTC offset for the whole range (checked daily) -> a single datetime64 cast;
+    # a DST switch inside the range falls back to per-row datetime.
+    probes = np.append(np.arange(ts[0], ts[-1], 86400.0), ts[-1])
+    offsets = {datetime.fromtimestamp(t).astimezone().utcoffset() for t in probes.tolist()}
+    if len(offsets) != 1:
+        fromtimestamp = datetime.fromtimestamp
+        return np.array([fromtimestamp(t).isoformat() for t in ts.tolist()])
+    offset_s = int(offsets.pop().total_seconds())
+    # split like datetime does: whole seconds + rounded microseconds, ".ffffff" omitted when 0
+    sec = np.floor(ts)
+    us = np.round((ts - sec) * 1e6).astype(np.int64)
+    carry = us >= 1_000_000
+    sec[carry] += 1
+    us[carry] -= 1_000_000
+    base = np.datetime_as_string((sec.astype(np.int64) + offset_s).astype("datetime64[s]"), unit="s")
+    frac = np.char.add(".", np.char.zfill(us.astype(str), 6))
+    return np.char.add(base, np.where(us == 0, "", frac))
 
 
 def export_to_excel():
@@ -510,23 +703,27 @@ def export_to_excel():
         log.set_status("Диапазон времени некорректен")
         return
 
-    rows = storage.get_series(tag_name=tag, since_ts=start_ts, limit=20000)
-    filtered = []
-    last_ts = 0.0
-    for ts, value in rows:
-        if ts > end_ts:
-            continue
-        if not filtered or ts - last_ts >= step:
-            filtered.append((ts, value))
-            last_ts = ts
-
     filename = f"{tag}_export.csv"
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "datetime", "value"])
-        for ts, value in filtered:
-            writer.writerow([ts, datetime.fromtimestamp(ts).isoformat(), value])
-    log.set_status(f"Экспортировано: {filename}")
+    log.set_status(f"Экспорт {tag} ...")
+
+    def worker():
+        try:
+            arr = storage.get_series_np(tag_name=tag, since_ts=start_ts, limit=20000)
+            arr = arr[: np.searchsorted(arr[:, 0], end_ts, side="right")]
+            arr = arr[_thin_indices(arr[:, 0], step)]
+            iso = _iso_local(arr[:, 0])
+            out = list(zip(arr[:, 0].tolist(), iso.tolist(), arr[:, 1].tolist()))
+            with open(filename, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+                writer = csv.writer(f)
+                writer.writerow(["timestamp", "datetime", "value"])
+                writer.writerows(out)
+        except Exception as exc:
+            log.log(f"Export error: {exc}")
+            ui_post(partial(log.set_status, f"Ошибка экспорта: {exc}"))
+            return
+        ui_post(partial(log.set_status, f"Экспортировано: {filename} ({len(out)} строк)"))
+
+    threading.Thread(target=worker, daemon=True).start()
 
 
 def check_snap7_import():
@@ -568,13 +765,13 @@ def _build_layout():
             dpg.add_input_int(label="Slot", default_value=1, width=80, tag=CONNECT_SLOT_TAG)
             dpg.add_input_int(label="Port", default_value=1102, width=100, tag=CONNECT_PORT_TAG)
 
-        with dpg.child_window(tag="scan_results", height=220, autosize_x=True, border=True):
-            dpg.add_text("Результаты появятся здесь.")
+        with dpg.child_window(tag=SCAN_RESULTS_TAG, height=220, autosize_x=True, border=True):
+            dpg.add_text("Результаты появятся здесь.", tag=SCAN_EMPTY_TAG)
 
         dpg.add_separator()
         dpg.add_text("Теги:")
         with dpg.child_window(tag=TAG_LIST_PARENT, height=180, autosize_x=True, border=True):
-            dpg.add_text("Теги не загружены.")
+            dpg.add_text("Теги не загружены.", tag=TAG_LIST_EMPTY_TAG)
 
         dpg.add_separator()
         dpg.add_text("Тренд (онлайн/оффлайн):")
@@ -603,6 +800,9 @@ def _build_layout():
         dpg.add_text("Debug Console:")
         log.build_console(height=260)
 
+    global _TREND_UI_READY
+    _TREND_UI_READY = True
+
 
 def run():
     dpg.create_context()
@@ -626,5 +826,8 @@ def run():
         log.log(f"site-packages unavailable: {exc}")
 
     log.log("UI started")
+    trend_scheduler.start()
     dpg.start_dearpygui()
+    trend_scheduler.stop()
     dpg.destroy_context()
+    storage.close()
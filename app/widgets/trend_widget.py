@@ -7,7 +7,7 @@ def build(widget_id: str, ctx, parent_tag: str):
     series_tag = f"{widget_id}::series"
 
     st.trend_map.setdefault(widget_id, st.global_trend_tag or "")
-    st.trend_series.setdefault(widget_id, (st.__class__.max_points if False else None))  # no-op
+    st.trend_series.setdefault(widget_id, st.new_series())
 
     with dpg.child_window(parent=parent_tag, autosize_x=True, height=360, border=True):
         dpg.add_text(f"Trend Widget: {widget_id}")
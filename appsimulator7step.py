@@ -1,4 +1,8 @@
+import asyncio
+import os
+import sys
 import time
+import functools
 import math
 import random
 import threading
@@ -6,8 +10,8 @@ import queue
 import socket
 import ctypes
 import struct
-from dataclasses import dataclass, field
-from typing import Optional, Tuple, Dict
+from dataclasses import dataclass
+from typing import Optional, Tuple
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
@@ -18,10 +22,11 @@ import csv
 # ===========================
 SNAP7_OK = False
 PYMODBUS_OK = False
+MODBUS_ASYNC_OK = False
+NUMBA_OK = False
 
 try:
     from snap7.server import Server
-    from snap7.util import set_real, set_dint
     SNAP7_OK = True
 except Exception:
     SNAP7_OK = False
@@ -49,6 +54,26 @@ except Exception:
     PYMODBUS_OK = False
     _BLOCK_KIND = "none"
 
+try:
+    # pymodbus 3.x: asyncio server that can be shut down without exiting the process
+    from pymodbus.server import ModbusTcpServer
+    MODBUS_ASYNC_OK = True
+except Exception:
+    MODBUS_ASYNC_OK = False
+
+try:
+    # numba only speeds up the generator math; without it _step runs as plain Python
+    import numpy as np
+    from numba import njit
+    NUMBA_OK = True
+except Exception:
+    NUMBA_OK = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
 # ===========================
 # Defaults / layout
 # ===========================
@@ -62,6 +87,11 @@ OFF_PN_LEVEL = 4
 OFF_PN_ENCODER = 8
 OFF_PN_CURRENT = 12
 OFF_PN_SPEED = 16
+# PN_* fields are contiguous in DB1: written with one pack_into per tick
+S7_PN = struct.Struct(">ffiff")
+assert (OFF_PN_LEVEL, OFF_PN_ENCODER, OFF_PN_CURRENT, OFF_PN_SPEED) == tuple(
+    OFF_PN_TEMP + 4 * i for i in range(1, 5)
+) and S7_PN.size == 20
 
 # Modbus Holding Registers (0-based inside pymodbus)
 MB_OFF_TEMP = 0   # 2 regs float
@@ -69,15 +99,33 @@ MB_OFF_LEVEL = 2
 MB_OFF_FLOW = 4
 MB_OFF_PRESS = 6
 MB_OFF_COUNTER = 8  # 2 regs u32
+# MB_* registers are contiguous: written as one block per tick
+MB_BASE = MB_OFF_TEMP
+MB_REG_COUNT = MB_OFF_COUNTER + 2 - MB_BASE
+
+# Generator channels (float signals), see _step()
+CH_PN_TEMP = 0
+CH_PN_LEVEL = 1
+CH_PN_CURRENT = 2
+CH_PN_SPEED = 3
+CH_MB_TEMP = 4
+CH_MB_LEVEL = 5
+CH_MB_FLOW = 6
+CH_MB_PRESS = 7
+N_CHANNELS = 8
 
 UPDATE_DT_DEFAULT = 0.05
 REPORT_UI_DT_MS = 200
+LOG_DRAIN_MAX = 200        # log lines moved to the Text widget per UI tick
+LOG_MAX_LINES = 5000       # lines kept in the Text widget
+LOG_TRIM_EVERY_TICKS = 100
 
 # ===========================
 # Helpers
 # ===========================
+@functools.lru_cache(maxsize=1)
 def guess_local_ip() -> str:
-    # best-effort: find a non-loopback IPv4
+    # best-effort: find a non-loopback IPv4 (resolved once; getaddrinfo may block on slow DNS)
     candidates = []
     try:
         infos = socket.getaddrinfo(socket.gethostname(), None)
@@ -99,11 +147,8 @@ def guess_local_ip() -> str:
     except Exception:
         pass
 
-    # unique + prefer private ranges
-    uniq = []
-    for ip in candidates:
-        if ip not in uniq:
-            uniq.append(ip)
+    # unique (order kept) + prefer private ranges
+    uniq = list(dict.fromkeys(candidates))
 
     for pref in ("10.", "192.168.", "172.16."):
         for ip in uniq:
@@ -113,16 +158,17 @@ def guess_local_ip() -> str:
     return uniq[0] if uniq else "127.0.0.1"
 
 
+_PACK_F = struct.Struct(">f").pack
+_UNPACK_HH = struct.Struct(">HH").unpack
+
+
 def float_to_regs_be(value: float) -> Tuple[int, int]:
-    b = struct.pack(">f", float(value))
-    hi, lo = struct.unpack(">HH", b)
-    return hi, lo
+    return _UNPACK_HH(_PACK_F(float(value)))
 
 
 def u32_to_regs_be(value: int) -> Tuple[int, int]:
-    b = struct.pack(">I", int(value) & 0xFFFFFFFF)
-    hi, lo = struct.unpack(">HH", b)
-    return hi, lo
+    v = int(value) & 0xFFFFFFFF
+    return (v >> 16) & 0xFFFF, v & 0xFFFF
 
 
 def ts() -> str:
@@ -132,23 +178,32 @@ def ts() -> str:
 # ===========================
 # Shared state
 # ===========================
+# Packed tag snapshot (big-endian):
+#   PN_* (S7 DB1):  pn_temp f, pn_level f, pn_encoder i, pn_current f, pn_speed f
+#   MB_* (Modbus):  mb_temp f, mb_level f, mb_flow f, mb_press f, mb_counter I
+TAG_STATE = struct.Struct(">ffiffffffI")
+# The MB_* tail of the snapshot is already the HR block (BE words, MB_OFF_* order)
+MB_REGS = struct.Struct(f">{MB_REG_COUNT}H")
+MB_SNAPSHOT_OFFSET = S7_PN.size
+assert MB_SNAPSHOT_OFFSET + MB_REGS.size == TAG_STATE.size
+# ...and the PN_* head is byte-for-byte the DB1 image at OFF_PN_TEMP
+PN_DB1_SLICE = slice(OFF_PN_TEMP, OFF_PN_TEMP + S7_PN.size)
+PN_SNAPSHOT_SLICE = slice(0, S7_PN.size)
+
+
 @dataclass
 class TagState:
-    # PN_* (S7 DB1)
-    pn_temp: float = 0.0
-    pn_level: float = 0.0
-    pn_encoder: int = 0
-    pn_current: float = 0.0
-    pn_speed: float = 0.0
+    # The generator publishes a new bytes object per tick; replacing the
+    # attribute is atomic, so readers just unpack it without any lock.
+    snapshot: bytes = TAG_STATE.pack(0.0, 0.0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)
 
-    # MB_* (Modbus)
-    mb_temp: float = 0.0
-    mb_level: float = 0.0
-    mb_flow: float = 0.0
-    mb_press: float = 0.0
-    mb_counter: int = 0
+    def publish(self, pn_temp, pn_level, pn_encoder, pn_current, pn_speed,
+                mb_temp, mb_level, mb_flow, mb_press, mb_counter):
+        self.snapshot = TAG_STATE.pack(pn_temp, pn_level, pn_encoder, pn_current, pn_speed,
+                                       mb_temp, mb_level, mb_flow, mb_press, mb_counter)
 
-    lock: threading.Lock = field(default_factory=threading.Lock)
+    def read(self) -> tuple:
+        return TAG_STATE.unpack(self.snapshot)
 
 
 @dataclass
@@ -159,26 +214,96 @@ class ModbusStats:
     last_write_ts: float = 0.0
     last_read_range: Optional[Tuple[int, int]] = None   # (address, count)
     last_write_range: Optional[Tuple[int, int]] = None  # (address, count)
+    # capture log is coalesced: totals at the time of the last logged line
+    read_logged_ts: float = 0.0
+    read_logged_total: int = 0
+    write_logged_ts: float = 0.0
+    write_logged_total: int = 0
 
 
 # ===========================
 # Logging
 # ===========================
 class LogSink:
-    def __init__(self):
-        self.q = queue.Queue()
+    # Bounded: if the UI stops draining, new messages are dropped (and counted)
+    # instead of growing the queue without limit.
+    # Queue items are (ts, level, fmt, args); the consumer renders fmt % args
+    # (see format_record), so producer threads never pay for formatting.
+    def __init__(self, maxsize: int = 10000):
+        self.q = queue.SimpleQueue()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+        self._drop_reported = 0.0
+        # Modbus capture log lines (counters are always kept); toggled from the GUI
+        self.capture_enabled = True
 
     def log(self, level: str, msg: str):
-        self.q.put((time.time(), level.upper(), msg))
+        self.logf(level, msg)
+
+    def logf(self, level: str, fmt: str, *args):
+        """Queue a message whose `fmt % args` formatting is done by the consumer."""
+        now = time.time()
+        if self.q.qsize() >= self.maxsize:
+            with self._drop_lock:
+                self.dropped += 1
+            return
+        if self.dropped and now - self._drop_reported >= 1.0:
+            with self._drop_lock:
+                n, self.dropped = self.dropped, 0
+                self._drop_reported = now
+            if n:
+                self.q.put((now, "WARN", "Log queue full: dropped %d message(s)", (n,)))
+        self.q.put((now, level.upper(), fmt, args))
 
     def info(self, msg: str): self.log("INFO", msg)
     def warn(self, msg: str): self.log("WARN", msg)
     def err(self, msg: str): self.log("ERROR", msg)
 
 
+def format_record(fmt: str, args: tuple) -> str:
+    # messages without args are used verbatim (they may contain '%')
+    if not args:
+        return fmt
+    try:
+        return fmt % args
+    except Exception:
+        return f"{fmt} {args!r}"
+
+
 # ===========================
 # Modbus datastore with capture
 # ===========================
+CAPTURE_LOG_PERIOD_S = 1.0  # at most one READ / WRITE log line per period
+_CAPTURE_READ_MSG = "Modbus READ  x%d last addr=%d count=%d"
+_CAPTURE_WRITE_MSG = "Modbus WRITE x%d last addr=%d count=%d values=%s%s"
+
+
+def _capture_read(stats: ModbusStats, logger: LogSink, address, count):
+    now = time.time()
+    stats.reads_total += 1
+    stats.last_read_ts = now
+    stats.last_read_range = (address, count)
+    if logger.capture_enabled and now - stats.read_logged_ts >= CAPTURE_LOG_PERIOD_S:
+        n = stats.reads_total - stats.read_logged_total
+        logger.logf("INFO", _CAPTURE_READ_MSG, n, address, count)
+        stats.read_logged_ts = now
+        stats.read_logged_total = stats.reads_total
+
+
+def _capture_write(stats: ModbusStats, logger: LogSink, address, values):
+    now = time.time()
+    stats.writes_total += 1
+    stats.last_write_ts = now
+    stats.last_write_range = (address, len(values))
+    if logger.capture_enabled and now - stats.write_logged_ts >= CAPTURE_LOG_PERIOD_S:
+        n = stats.writes_total - stats.write_logged_total
+        count = len(values)
+        logger.logf("INFO", _CAPTURE_WRITE_MSG, n, address, count, list(values[:8]), "..." if count > 8 else "")
+        stats.write_logged_ts = now
+        stats.write_logged_total = stats.writes_total
+
+
 def make_capturing_block(initial_size: int, stats: ModbusStats, logger: LogSink):
     """
     Returns a DataBlock that counts reads/writes.
@@ -193,17 +318,11 @@ def make_capturing_block(initial_size: int, stats: ModbusStats, logger: LogSink)
 
         class CapturingSparse(ModbusSparseDataBlock):  # type: ignore
             def getValues(self, address, count=1):
-                stats.reads_total += 1
-                stats.last_read_ts = time.time()
-                stats.last_read_range = (address, count)
-                logger.info(f"Modbus READ  addr={address} count={count}")
+                _capture_read(stats, logger, address, count)
                 return super().getValues(address, count)
 
             def setValues(self, address, values):
-                stats.writes_total += 1
-                stats.last_write_ts = time.time()
-                stats.last_write_range = (address, len(values))
-                logger.info(f"Modbus WRITE addr={address} count={len(values)} values={values[:8]}{'...' if len(values)>8 else ''}")
+                _capture_write(stats, logger, address, values)
                 return super().setValues(address, values)
 
         return CapturingSparse(initial)
@@ -213,63 +332,129 @@ def make_capturing_block(initial_size: int, stats: ModbusStats, logger: LogSink)
 
     class CapturingSeq(ModbusSequentialDataBlock):
         def getValues(self, address, count=1):
-            stats.reads_total += 1
-            stats.last_read_ts = time.time()
-            stats.last_read_range = (address, count)
-            logger.info(f"Modbus READ  addr={address} count={count}")
+            _capture_read(stats, logger, address, count)
             return super().getValues(address, count)
 
         def setValues(self, address, values):
-            stats.writes_total += 1
-            stats.last_write_ts = time.time()
-            stats.last_write_range = (address, len(values))
-            logger.info(f"Modbus WRITE addr={address} count={len(values)} values={values[:8]}{'...' if len(values)>8 else ''}")
+            _capture_write(stats, logger, address, values)
             return super().setValues(address, values)
 
     return CapturingSeq(0, [0] * initial_size)
 
 
+# ===========================
+# Thread tuning
+# ===========================
+# Producer threads get their own core and a higher priority when the OS allows
+# it; the Tk main loop stays unpinned. Pinning needs at least THREAD_MIN_CPUS
+# cores so one is always left for the GUI.
+THREAD_CPU_GENERATOR = 0
+THREAD_CPU_S7 = 1
+THREAD_CPU_MB_WRITER = 2
+THREAD_MIN_CPUS = 4
+THREAD_NICE = -5
+
+
+def tune_current_thread(cpu: int) -> str:
+    """Best effort: pin the calling thread to `cpu` and raise its priority.
+
+    Linux: sched_setaffinity + nice (per-thread there; a negative nice needs
+    CAP_SYS_NICE, otherwise it is skipped). Windows: SetThreadPriority
+    (ABOVE_NORMAL). Elsewhere (macOS) nothing is changed.
+    Returns a short description for the log.
+    """
+    done = []
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            if (os.cpu_count() or 1) >= THREAD_MIN_CPUS:
+                os.sched_setaffinity(0, {cpu})
+                done.append(f"cpu {cpu}")
+        except Exception:
+            pass
+        try:
+            os.nice(THREAD_NICE)
+            done.append(f"nice {THREAD_NICE}")
+        except Exception:
+            pass
+    elif sys.platform == "win32":
+        try:
+            k32 = ctypes.windll.kernel32
+            if k32.SetThreadPriority(k32.GetCurrentThread(), 1):  # THREAD_PRIORITY_ABOVE_NORMAL
+                done.append("priority above normal")
+        except Exception:
+            pass
+    return ", ".join(done) or "default scheduling"
+
+
+# ===========================
+# Tick pacing
+# ===========================
+def pace(stop_evt: threading.Event, next_t: float, dt: float) -> Optional[float]:
+    """Wait for the next tick deadline (perf_counter based) and return it.
+
+    Sleeps only the time left after the tick's work; if the deadline has
+    already passed, missed ticks are dropped instead of run back to back.
+    The wait is stop_evt.wait(), so a stop wakes the thread at once; then
+    None is returned and the loop ends:
+
+        next_t = time.perf_counter()
+        while next_t is not None:
+            ...work...
+            next_t = pace(stop_evt, next_t, dt)
+    """
+    next_t += dt
+    delay = next_t - time.perf_counter()
+    if delay > 0:
+        if stop_evt.wait(delay):
+            return None
+    else:
+        if stop_evt.is_set():
+            return None
+        next_t = time.perf_counter()
+    return next_t
+
+
 # ===========================
 # Generator thread
 # ===========================
+@njit(cache=True, fastmath=True)
+def _step(ch, t):
+    # all float waveforms of one tick; compiled by numba when available
+    # PN_* (S7 DB1)
+    ch[CH_PN_TEMP] = 20.0 + 5.0 * math.sin(t / 5.0) + random.random() * 0.4 - 0.2
+    ch[CH_PN_LEVEL] = 50.0 + 20.0 * math.sin(t / 7.0)
+    ch[CH_PN_CURRENT] = 3.0 + 0.5 * math.sin(t / 2.0) + random.random() * 0.1 - 0.05
+    ch[CH_PN_SPEED] = 1500.0 + 200.0 * math.sin(t / 3.0)
+    # MB_* (Modbus)
+    ch[CH_MB_TEMP] = 60.0 + 10.0 * math.sin(t / 4.0) + random.random() * 0.6 - 0.3
+    ch[CH_MB_LEVEL] = 10.0 + 5.0 * (0.5 + 0.5 * math.sin(t / 6.0))
+    ch[CH_MB_FLOW] = 1.5 + 0.3 * math.sin(t / 1.5)
+    ch[CH_MB_PRESS] = 2.0 + 0.2 * math.sin(t / 2.5) + random.random() * 0.04 - 0.02
+
+
 def generator_loop(state: TagState, stop_evt: threading.Event, dt_getter, logger: LogSink):
     t0 = time.perf_counter()
     enc = 0
     cnt = 0
+    ch = np.zeros(N_CHANNELS) if NUMBA_OK else [0.0] * N_CHANNELS
 
-    logger.info("Generator started")
-    while not stop_evt.is_set():
+    logger.info(f"Generator started ({'numba' if NUMBA_OK else 'python'}; "
+                f"{tune_current_thread(THREAD_CPU_GENERATOR)})")
+    next_t = time.perf_counter()
+    while next_t is not None:
         now = time.perf_counter()
         t = now - t0
 
-        # PN_* (S7 DB1)
-        pn_temp = 20.0 + 5.0 * math.sin(t / 5.0) + random.uniform(-0.2, 0.2)
-        pn_level = 50.0 + 20.0 * math.sin(t / 7.0)
+        _step(ch, t)
         enc = (enc + 5) % 1_000_000
-        pn_current = 3.0 + 0.5 * math.sin(t / 2.0) + random.uniform(-0.05, 0.05)
-        pn_speed = 1500.0 + 200.0 * math.sin(t / 3.0)
-
-        # MB_* (Modbus)
-        mb_temp = 60.0 + 10.0 * math.sin(t / 4.0) + random.uniform(-0.3, 0.3)
-        mb_level = 10.0 + 5.0 * (0.5 + 0.5 * math.sin(t / 6.0))
-        mb_flow = 1.5 + 0.3 * math.sin(t / 1.5)
-        mb_press = 2.0 + 0.2 * math.sin(t / 2.5) + random.uniform(-0.02, 0.02)
         cnt = (cnt + 1) & 0xFFFFFFFF
 
-        with state.lock:
-            state.pn_temp = float(pn_temp)
-            state.pn_level = float(pn_level)
-            state.pn_encoder = int(enc)
-            state.pn_current = float(pn_current)
-            state.pn_speed = float(pn_speed)
-
-            state.mb_temp = float(mb_temp)
-            state.mb_level = float(mb_level)
-            state.mb_flow = float(mb_flow)
-            state.mb_press = float(mb_press)
-            state.mb_counter = int(cnt)
+        state.publish(
+            ch[CH_PN_TEMP], ch[CH_PN_LEVEL], enc, ch[CH_PN_CURRENT], ch[CH_PN_SPEED],
+            ch[CH_MB_TEMP], ch[CH_MB_LEVEL], ch[CH_MB_FLOW], ch[CH_MB_PRESS], cnt,
+        )
 
-        time.sleep(max(0.005, float(dt_getter())))
+        next_t = pace(stop_evt, next_t, max(0.005, float(dt_getter())))
 
     logger.info("Generator stopped")
 
@@ -304,17 +489,21 @@ def s7_server_loop(state: TagState, stop_evt: threading.Event, port_getter, logg
             srv.start()
             started_port = 102
 
-        logger.info(f"S7 server started (DB1) on port {started_port} (PN_* tags)")
+        logger.info(f"S7 server started (DB1) on port {started_port} (PN_* tags; "
+                    f"{tune_current_thread(THREAD_CPU_S7)})")
         logger.info("S7 DB1 layout: DBD0 TEMP, DBD4 LEVEL, DBD8 ENC(DINT), DBD12 CURR, DBD16 SPEED")
 
-        while not stop_evt.is_set():
-            with state.lock:
-                set_real(db1, OFF_PN_TEMP, state.pn_temp)
-                set_real(db1, OFF_PN_LEVEL, state.pn_level)
-                set_dint(db1, OFF_PN_ENCODER, state.pn_encoder)
-                set_real(db1, OFF_PN_CURRENT, state.pn_current)
-                set_real(db1, OFF_PN_SPEED, state.pn_speed)
-            time.sleep(0.01)
+        last = None
+        next_t = time.perf_counter()
+        while next_t is not None:
+            snap = state.snapshot
+            if snap is not last:  # skip ticks with no new snapshot from the generator
+                # One 20-byte copy into the buffer snap7 serves (db1_ctypes shares
+                # db1's memory). Measured cheaper than unpacking the snapshot and
+                # storing through numpy '>f4'/'>i4' views or ctypes.memmove.
+                db1[PN_DB1_SLICE] = snap[PN_SNAPSHOT_SLICE]
+                last = snap
+            next_t = pace(stop_evt, next_t, 0.01)
 
     except Exception as e:
         logger.err(f"S7 server error: {e}")
@@ -329,28 +518,71 @@ def s7_server_loop(state: TagState, stop_evt: threading.Event, port_getter, logg
 # ===========================
 # Modbus server thread (MB_* via Holding Registers)
 # ===========================
-def modbus_writer_loop(state: TagState, stop_evt: threading.Event, context, dt_getter):
-    while not stop_evt.is_set():
-        with state.lock:
-            t = state.mb_temp
-            l = state.mb_level
-            f = state.mb_flow
-            p = state.mb_press
-            c = state.mb_counter
-
-        regs: Dict[int, int] = {}
-        regs[MB_OFF_TEMP], regs[MB_OFF_TEMP + 1] = float_to_regs_be(t)
-        regs[MB_OFF_LEVEL], regs[MB_OFF_LEVEL + 1] = float_to_regs_be(l)
-        regs[MB_OFF_FLOW], regs[MB_OFF_FLOW + 1] = float_to_regs_be(f)
-        regs[MB_OFF_PRESS], regs[MB_OFF_PRESS + 1] = float_to_regs_be(p)
-        regs[MB_OFF_COUNTER], regs[MB_OFF_COUNTER + 1] = u32_to_regs_be(c)
-
-        slave = context[0x00]
-        hr = slave.store["h"]
-        for addr, val in regs.items():
-            hr.setValues(addr, [val])
-
-        time.sleep(max(0.005, float(dt_getter())))
+def modbus_writer_loop(state: TagState, stop_evt: threading.Event, context, dt_getter,
+                       logger: Optional[LogSink] = None):
+    tuned = tune_current_thread(THREAD_CPU_MB_WRITER)
+    if logger is not None:
+        logger.info(f"Modbus writer started ({tuned})")
+
+    # Staging buffer reused every tick. It must stay a list: pymodbus data
+    # blocks treat any non-list value (array, tuple) as one single register.
+    regs = [0] * MB_REG_COUNT
+    last = None
+    next_t = time.perf_counter()
+    while next_t is not None:
+        # Republish only when the generator published a new snapshot (MB_COUNTER
+        # changes on every generator tick, so a byte compare would never skip).
+        snap = state.snapshot
+        if snap is not last:
+            regs[:] = MB_REGS.unpack_from(snap, MB_SNAPSHOT_OFFSET)
+
+            slave = context[0x00]
+            hr = slave.store["h"]
+            hr.setValues(MB_BASE, regs)
+            last = snap
+
+        next_t = pace(stop_evt, next_t, max(0.005, float(dt_getter())))
+
+
+async def modbus_serve_async(state: TagState, stop_evt: threading.Event, context, host: str, port: int,
+                             dt_getter, logger: LogSink):
+    """Modbus TCP server + HR writer as tasks of one asyncio loop.
+
+    The writer task checks stop_evt every tick; when it is set the server is
+    shut down and the coroutine returns, so Stop/Start works without a restart.
+    """
+    loop = asyncio.get_running_loop()
+    server = ModbusTcpServer(context=context, address=(host, port))
+    serve = loop.create_task(server.serve_forever())
+
+    hr = context[0x00].store["h"]
+    regs = [0] * MB_REG_COUNT  # must stay a list, see modbus_writer_loop
+    last = None
+    next_t = loop.time()
+    try:
+        while not stop_evt.is_set() and not serve.done():
+            snap = state.snapshot
+            if snap is not last:  # new snapshot only, see modbus_writer_loop
+                regs[:] = MB_REGS.unpack_from(snap, MB_SNAPSHOT_OFFSET)
+                hr.setValues(MB_BASE, regs)
+                last = snap
+
+            # same pacing as pace(), on the loop clock
+            next_t += max(0.005, float(dt_getter()))
+            delay = next_t - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_t = loop.time()
+                await asyncio.sleep(0)
+    finally:
+        res = server.shutdown()
+        if asyncio.iscoroutine(res):  # async in pymodbus 3.x
+            await res
+        if serve.done():
+            serve.result()  # re-raise a bind error etc.
+        else:
+            serve.cancel()
 
 
 def modbus_server_loop(state: TagState, stop_evt: threading.Event, host_getter, port_getter, dt_getter,
@@ -393,10 +625,6 @@ def modbus_server_loop(state: TagState, stop_evt: threading.Event, host_getter,
         host = str(host_getter()).strip() or "0.0.0.0"
         port = int(port_getter())
 
-        # Writer thread (feeds generated values into HR)
-        tw = threading.Thread(target=modbus_writer_loop, args=(state, stop_evt, ctx, dt_getter), daemon=True)
-        tw.start()
-
         logger.info(f"Modbus TCP server started on {host}:{port} (MB_* tags)")
         logger.info("Holding Registers map (1-based human):")
         logger.info("  40001-40002 MB_TEMP   float32 (BE words)")
@@ -405,14 +633,22 @@ def modbus_server_loop(state: TagState, stop_evt: threading.Event, host_getter,
         logger.info("  40007-40008 MB_PRESS  float32 (BE words)")
         logger.info("  40009-40010 MB_COUNTER uint32 (BE words)")
 
-        # This call blocks until process ends; we stop by setting stop_evt and letting app exit.
-        # Some pymodbus versions don’t support graceful stop of StartTcpServer; typical pattern is run as daemon.
+        if MODBUS_ASYNC_OK:
+            # Server and writer share this thread's event loop; returns on stop_evt
+            logger.info(f"Modbus writer started (asyncio; {tune_current_thread(THREAD_CPU_MB_WRITER)})")
+            asyncio.run(modbus_serve_async(state, stop_evt, ctx, host, port, dt_getter, logger))
+            logger.info("Modbus server stopped")
+            return
+
+        # Older pymodbus: writer thread (feeds generated values into HR) +
+        # blocking StartTcpServer, which only stops when the process exits.
+        tw = threading.Thread(target=modbus_writer_loop, args=(state, stop_evt, ctx, dt_getter, logger), daemon=True)
+        tw.start()
         StartTcpServer(context=ctx, address=(host, port))
+        logger.info("Modbus server stopped (process exit)")
 
     except Exception as e:
         logger.err(f"Modbus server error: {e}")
-    finally:
-        logger.info("Modbus server stopped (process exit)")
 
 
 # ===========================
@@ -433,6 +669,11 @@ class App(tk.Tk):
         self._threads = []
         self._running = False
 
+        # last text pushed to each label, so _ui_tick only touches Tk on changes
+        self._last_texts = {}
+        self._last_stats_key = None
+        self._ui_ticks = 0
+
         self._build_ui()
         self.after(REPORT_UI_DT_MS, self._ui_tick)
 
@@ -540,6 +781,14 @@ class App(tk.Tk):
         self.lbl_mb_stats = ttk.Label(mb, text="Reads: 0 (last: -), Writes: 0 (last: -)")
         self.lbl_mb_stats.pack(anchor="w", pady=(8, 0))
 
+        self.var_capture_log = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            mb,
+            text="Log Modbus requests",
+            variable=self.var_capture_log,
+            command=self._on_capture_log_toggle,
+        ).pack(anchor="w", pady=(4, 0))
+
         grid.grid_columnconfigure(0, weight=1)
         grid.grid_columnconfigure(1, weight=1)
 
@@ -576,9 +825,11 @@ class App(tk.Tk):
         lines = []
         lines.append(f"python-snap7: {'OK' if SNAP7_OK else 'NOT INSTALLED'}")
         lines.append(f"pymodbus:     {'OK' if PYMODBUS_OK else 'NOT INSTALLED'} (block={_BLOCK_KIND})")
+        lines.append(f"numba:        {'OK' if NUMBA_OK else 'not installed (optional, pure-Python generator)'}")
         lines.append("")
         lines.append("Install:")
         lines.append("  pip install python-snap7 pymodbus")
+        lines.append("  pip install numba  # optional")
         return "\n".join(lines)
 
     def _export_tags_csv(self):
@@ -614,6 +865,9 @@ class App(tk.Tk):
         except Exception as exc:
             messagebox.showerror("Export CSV", f"Ошибка экспорта: {exc}")
 
+    def _on_capture_log_toggle(self):
+        self.logger.capture_enabled = bool(self.var_capture_log.get())
+
     # Getters for threads
     def _get_dt(self): return float(self.var_dt.get())
     def _get_s7_port(self): return int(self.var_s7_port.get())
@@ -628,7 +882,9 @@ class App(tk.Tk):
             messagebox.showerror("Missing dependencies", "Neither python-snap7 nor pymodbus is installed.\nInstall:\n  pip install python-snap7 pymodbus")
             return
 
-        self.stop_evt.clear()
+        # fresh event per run: threads of a previous run still winding down
+        # keep seeing their own (set) event
+        self.stop_evt = threading.Event()
         self._threads.clear()
 
         # Generator
@@ -671,62 +927,76 @@ class App(tk.Tk):
     def stop_all(self):
         if not self._running:
             return
-        self.logger.warn("Stop requested. Some servers may stop only when process exits (pymodbus StartTcpServer).")
+        if PYMODBUS_OK and not MODBUS_ASYNC_OK:
+            self.logger.warn("Stop requested. Modbus server stops only when process exits (pymodbus StartTcpServer).")
+        else:
+            self.logger.info("Stop requested.")
         self.stop_evt.set()
         self._running = False
         self.btn_start.configure(state="normal")
         self.btn_stop.configure(state="disabled")
-        self.var_status.set("Stopped (generator stopped; servers may require process exit)")
-        # Note: StartTcpServer is blocking; if you need true stop/start without exiting,
-        # tell me your pymodbus version — I’ll switch to async server with proper shutdown.
+        if PYMODBUS_OK and not MODBUS_ASYNC_OK:
+            self.var_status.set("Stopped (generator stopped; Modbus server requires process exit)")
+        else:
+            self.var_status.set("Stopped")
+
+    def _set_text(self, label, text: str):
+        # configure() is a Tcl round-trip + relayout: skip it when nothing changed
+        if self._last_texts.get(label) != text:
+            label.configure(text=text)
+            self._last_texts[label] = text
 
     def _ui_tick(self):
         # Update live values
-        with self.state.lock:
-            pn_temp = self.state.pn_temp
-            pn_level = self.state.pn_level
-            pn_enc = self.state.pn_encoder
-            pn_curr = self.state.pn_current
-            pn_speed = self.state.pn_speed
-
-            mb_temp = self.state.mb_temp
-            mb_level = self.state.mb_level
-            mb_flow = self.state.mb_flow
-            mb_press = self.state.mb_press
-            mb_cnt = self.state.mb_counter
-
-        self.lbl_pn_temp.configure(text=f"PN_TEMP:    {pn_temp:8.2f}")
-        self.lbl_pn_level.configure(text=f"PN_LEVEL:   {pn_level:8.2f}")
-        self.lbl_pn_enc.configure(text=f"PN_ENCODER: {pn_enc:8d}")
-        self.lbl_pn_curr.configure(text=f"PN_CURRENT: {pn_curr:8.2f}")
-        self.lbl_pn_speed.configure(text=f"PN_SPEED:   {pn_speed:8.1f}")
-
-        self.lbl_mb_temp.configure(text=f"MB_TEMP:    {mb_temp:8.2f}")
-        self.lbl_mb_level.configure(text=f"MB_LEVEL:   {mb_level:8.2f}")
-        self.lbl_mb_flow.configure(text=f"MB_FLOW:    {mb_flow:8.2f}")
-        self.lbl_mb_press.configure(text=f"MB_PRESS:   {mb_press:8.2f}")
-        self.lbl_mb_cnt.configure(text=f"MB_COUNTER: {mb_cnt:8d}")
-
-        # Modbus stats
+        (pn_temp, pn_level, pn_enc, pn_curr, pn_speed,
+         mb_temp, mb_level, mb_flow, mb_press, mb_cnt) = self.state.read()
+
+        self._set_text(self.lbl_pn_temp, f"PN_TEMP:    {pn_temp:8.2f}")
+        self._set_text(self.lbl_pn_level, f"PN_LEVEL:   {pn_level:8.2f}")
+        self._set_text(self.lbl_pn_enc, f"PN_ENCODER: {pn_enc:8d}")
+        self._set_text(self.lbl_pn_curr, f"PN_CURRENT: {pn_curr:8.2f}")
+        self._set_text(self.lbl_pn_speed, f"PN_SPEED:   {pn_speed:8.1f}")
+
+        self._set_text(self.lbl_mb_temp, f"MB_TEMP:    {mb_temp:8.2f}")
+        self._set_text(self.lbl_mb_level, f"MB_LEVEL:   {mb_level:8.2f}")
+        self._set_text(self.lbl_mb_flow, f"MB_FLOW:    {mb_flow:8.2f}")
+        self._set_text(self.lbl_mb_press, f"MB_PRESS:   {mb_press:8.2f}")
+        self._set_text(self.lbl_mb_cnt, f"MB_COUNTER: {mb_cnt:8d}")
+
+        # Modbus stats (rebuilt only when a request came in since the last tick)
         st = self.modbus_stats
-        last_r = "-" if st.last_read_ts == 0 else time.strftime("%H:%M:%S", time.localtime(st.last_read_ts))
-        last_w = "-" if st.last_write_ts == 0 else time.strftime("%H:%M:%S", time.localtime(st.last_write_ts))
-        rr = "-" if not st.last_read_range else f"{st.last_read_range}"
-        wr = "-" if not st.last_write_range else f"{st.last_write_range}"
-        self.lbl_mb_stats.configure(
-            text=f"Reads: {st.reads_total} (last: {last_r}, range: {rr}) | Writes: {st.writes_total} (last: {last_w}, range: {wr})"
-        )
+        stats_key = (st.reads_total, st.writes_total)
+        if stats_key != self._last_stats_key:
+            self._last_stats_key = stats_key
+            last_r = "-" if st.last_read_ts == 0 else time.strftime("%H:%M:%S", time.localtime(st.last_read_ts))
+            last_w = "-" if st.last_write_ts == 0 else time.strftime("%H:%M:%S", time.localtime(st.last_write_ts))
+            rr = "-" if not st.last_read_range else f"{st.last_read_range}"
+            wr = "-" if not st.last_write_range else f"{st.last_write_range}"
+            self._set_text(
+                self.lbl_mb_stats,
+                f"Reads: {st.reads_total} (last: {last_r}, range: {rr}) | Writes: {st.writes_total} (last: {last_w}, range: {wr})",
+            )
 
-        # Drain logs
-        while True:
+        # Drain logs (bounded per tick, one insert for the whole batch);
+        # whatever is left stays queued for the next tick
+        lines = []
+        for _ in range(LOG_DRAIN_MAX):
             try:
-                tstamp, level, msg = self.logger.q.get_nowait()
+                tstamp, level, fmt, args = self.logger.q.get_nowait()
             except queue.Empty:
                 break
-            line = f"[{time.strftime('%H:%M:%S', time.localtime(tstamp))}] {level:<5} {msg}\n"
-            self.txt.insert("end", line)
+            msg = format_record(fmt, args)
+            lines.append(f"[{time.strftime('%H:%M:%S', time.localtime(tstamp))}] {level:<5} {msg}\n")
+        if lines:
+            self.txt.insert("end", "".join(lines))
             self.txt.see("end")
 
+        self._ui_ticks += 1
+        if self._ui_ticks % LOG_TRIM_EVERY_TICKS == 0:
+            n = int(self.txt.index("end-1c").split(".")[0])
+            if n > LOG_MAX_LINES:
+                self.txt.delete("1.0", f"{n - LOG_MAX_LINES}.0")
+
         self.after(REPORT_UI_DT_MS, self._ui_tick)
 
 
@@ -0,0 +1,54 @@
+import unittest
+
+from app.core.callbacks import positional_arity
+
+
+class _Panel:
+    def on_click(self, sender, app_data):
+        pass
+
+    def refresh(self):
+        pass
+
+
+class PositionalArityTest(unittest.TestCase):
+    def test_no_parameters(self):
+        def cb():
+            pass
+        self.assertEqual(positional_arity(cb), 0)
+        self.assertEqual(positional_arity(lambda: None), 0)
+
+    def test_defaults_are_not_filled_with_sender(self):
+        def cb(force=False):
+            pass
+        self.assertEqual(positional_arity(cb), 0)
+
+    def test_sender_and_app_data(self):
+        def cb(sender, app_data):
+            pass
+        self.assertEqual(positional_arity(cb), 2)
+
+    def test_required_and_optional(self):
+        def cb(sender, app_data=None):
+            pass
+        self.assertEqual(positional_arity(cb), 1)
+
+    def test_full_dpg_signature(self):
+        def cb(sender, app_data, user_data=None):
+            pass
+        self.assertEqual(positional_arity(cb), 3)
+
+    def test_var_positional(self):
+        def cb(*args):
+            pass
+        self.assertEqual(positional_arity(cb), 3)
+        self.assertEqual(positional_arity(lambda *_: None), 3)
+
+    def test_bound_method_excludes_self(self):
+        panel = _Panel()
+        self.assertEqual(positional_arity(panel.on_click), 2)
+        self.assertEqual(positional_arity(panel.refresh), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
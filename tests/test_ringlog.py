@@ -0,0 +1,40 @@
+import unittest
+
+from app.core.ringlog import RingLog
+
+
+class RingLogTest(unittest.TestCase):
+    def _log(self, lines, **kwargs):
+        log = RingLog(**kwargs)
+        for i in range(lines):
+            log.append(f"line {i}")
+        return log
+
+    def test_snapshot_skip_counts_from_newest(self):
+        log = self._log(10)
+        self.assertEqual(log.snapshot(2), "line 8\nline 9")
+        self.assertEqual(log.snapshot(2, skip=3), "line 5\nline 6")
+
+    def test_window_pinned_to_absolute_line_stays_put(self):
+        log = self._log(10)
+        end = log.total - 3  # paged back by three lines
+        before = log.snapshot(2, end=end)
+        for i in range(10, 15):
+            log.append(f"line {i}")
+        self.assertEqual(log.snapshot(2, end=end), before)
+        self.assertEqual(before, "line 5\nline 6")
+
+    def test_pinned_window_survives_eviction(self):
+        log = self._log(10, max_lines=5)
+        self.assertEqual(log.first_index, 5)
+        # the anchor points at evicted lines: fall back to the oldest ones held
+        self.assertEqual(log.snapshot(2, end=3), "line 5\nline 6")
+
+    def test_wraps_around_the_byte_buffer(self):
+        log = self._log(100, capacity=64)
+        self.assertEqual(log.snapshot(1), "line 99")
+        self.assertEqual(log.total, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
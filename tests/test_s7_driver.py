@@ -0,0 +1,82 @@
+import ctypes
+import enum
+import types
+import unittest
+from unittest import mock
+
+from app.drivers import s7_driver
+from app.drivers.s7_driver import ReadBlock, parse_tags_csv
+
+
+class _Areas(enum.Enum):  # python-snap7 1.x: plain Enum, not IntEnum
+    PE = 0x81
+    PA = 0x82
+    MK = 0x83
+    DB = 0x84
+
+
+class _WordLen(enum.Enum):
+    Bit = 0x01
+    Byte = 0x02
+
+
+class _S7DataItem(ctypes.Structure):
+    _fields_ = [
+        ("Area", ctypes.c_int32),
+        ("WordLen", ctypes.c_int32),
+        ("Result", ctypes.c_int32),
+        ("DBNumber", ctypes.c_int32),
+        ("Start", ctypes.c_int32),
+        ("Amount", ctypes.c_int32),
+        ("pData", ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+_PLAIN_ENUM_TYPES = types.SimpleNamespace(Areas=_Areas, WordLen=_WordLen, S7DataItem=_S7DataItem)
+
+
+class PrepareBatchesPlainEnumTest(unittest.TestCase):
+    def test_plain_enum_areas_and_wordlen(self):
+        blocks = [ReadBlock("DB", 1, 0, 20), ReadBlock("M", 0, 10, 4)]
+        with mock.patch.object(s7_driver, "snap7_types", _PLAIN_ENUM_TYPES):
+            batches = s7_driver._prepare_batches(blocks)
+
+        self.assertEqual(len(batches), 1)
+        items, chunk = batches[0]
+        self.assertEqual(chunk, blocks)
+        self.assertEqual([item.Area for item in items], [0x84, 0x83])
+        self.assertEqual([item.WordLen for item in items], [0x02, 0x02])
+        self.assertEqual([(item.DBNumber, item.Start, item.Amount) for item in items], [(1, 0, 20), (0, 10, 4)])
+        self.assertTrue(all(block.buf is not None for block in blocks))
+
+    def test_wordlen_fallback_constant(self):
+        legacy = types.SimpleNamespace(S7WLByte=0x02)
+        with mock.patch.object(s7_driver, "snap7_types", legacy):
+            self.assertEqual(s7_driver._wordlen_byte(), 0x02)
+
+
+class ParseTagsCsvTest(unittest.TestCase):
+    def test_bad_data_type_row_does_not_abort_import(self):
+        text = (
+            "name,area,db,byte_index,data_type,bit_index,deadband\n"
+            "Temp,DB,1,0,REAL,,0.5\n"
+            "Bad,DB,1,4,FLOAT64\n"
+            "Run,M,0,10,BOOL,3\n"
+        )
+        tags, errors = parse_tags_csv(text)
+
+        self.assertEqual([tag.name for tag in tags], ["Temp", "Run"])
+        self.assertEqual(tags[0].deadband, 0.5)
+        self.assertEqual(tags[1].bit_index, 3)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Строка 3:"))
+        self.assertIn("FLOAT64", errors[0])
+
+    def test_short_and_non_numeric_rows_are_reported(self):
+        tags, errors = parse_tags_csv("A,DB,1\nB,DB,x,0,INT\n# comment\nC,DB,1,2,INT\n")
+        self.assertEqual([tag.name for tag in tags], ["C"])
+        self.assertEqual([err.split(":")[0] for err in errors], ["Строка 1", "Строка 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
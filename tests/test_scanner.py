@@ -0,0 +1,60 @@
+import asyncio
+import errno
+import unittest
+from unittest import mock
+
+from app import scanner
+
+
+class MaxConcurrencyTest(unittest.TestCase):
+    @unittest.skipIf(scanner.resource is None, "RLIMIT_NOFILE is POSIX only")
+    def test_clamped_below_fd_limit(self):
+        with mock.patch.object(scanner.resource, "getrlimit", return_value=(1024, 4096)):
+            self.assertEqual(scanner._max_concurrency(), 1024 - scanner.SCAN_FD_HEADROOM)
+
+    @unittest.skipIf(scanner.resource is None, "RLIMIT_NOFILE is POSIX only")
+    def test_unlimited_uses_hard_cap(self):
+        limit = (scanner.resource.RLIM_INFINITY, scanner.resource.RLIM_INFINITY)
+        with mock.patch.object(scanner.resource, "getrlimit", return_value=limit):
+            self.assertEqual(scanner._max_concurrency(), scanner.SCAN_MAX_CONCURRENCY)
+
+
+class _Writer:
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class TcpCheckTest(unittest.TestCase):
+    def _run_with(self, side_effect):
+        calls = []
+
+        async def fake_open_connection(ip, port):
+            calls.append((ip, port))
+            exc = side_effect(len(calls))
+            if exc is not None:
+                raise exc
+            return None, _Writer()
+
+        with mock.patch.object(scanner.asyncio, "open_connection", fake_open_connection), \
+                mock.patch.object(scanner.asyncio, "sleep", mock.AsyncMock()):
+            result = asyncio.run(scanner._tcp_check_async("10.0.0.1", 102, 0.5))
+        return result, len(calls)
+
+    def test_emfile_is_retried_not_reported_closed(self):
+        emfile = OSError(errno.EMFILE, "Too many open files")
+        result, calls = self._run_with(lambda n: emfile if n <= 2 else None)
+        self.assertTrue(result)
+        self.assertEqual(calls, 3)
+
+    def test_refused_is_closed_without_retry(self):
+        refused = ConnectionRefusedError(errno.ECONNREFUSED, "refused")
+        result, calls = self._run_with(lambda n: refused)
+        self.assertFalse(result)
+        self.assertEqual(calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
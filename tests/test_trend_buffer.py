@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from app.storage.trend_buffer import TrendBuffer
+
+
+class TrendBufferTest(unittest.TestCase):
+    def test_arrays_start_small_and_grow(self):
+        buf = TrendBuffer(capacity=65536)
+        buf.append("A", 0.0, 0.0)
+        self.assertLess(buf._series["A"].ts.nbytes, 64 * 1024)
+
+        for i in range(1, 1000):
+            buf.append("A", float(i), float(i))
+        series = buf._series["A"]
+        self.assertGreaterEqual(series.ts.shape[0], 1000)
+        self.assertLessEqual(series.ts.shape[0], 2 * buf.capacity)
+
+        arr = buf.window("A", 0.0, limit=2000)
+        np.testing.assert_array_equal(arr[:, 0], np.arange(1000.0))
+        np.testing.assert_array_equal(arr[:, 1], np.arange(1000.0))
+
+    def test_keeps_newest_capacity_samples_once_full(self):
+        buf = TrendBuffer(capacity=100)
+        for i in range(1000):
+            buf.append("A", float(i), float(i))
+        series = buf._series["A"]
+        self.assertEqual(series.ts.shape[0], 200)
+        self.assertFalse(buf.covers("A", 0.0))
+        arr = buf.window("A", series.start, limit=1000)
+        self.assertEqual(arr[-1, 0], 999.0)
+        self.assertTrue(np.all(np.diff(arr[:, 0]) > 0))
+        self.assertGreaterEqual(len(arr), 100)
+        self.assertIsNone(buf.window("A", 0.0))
+
+    def test_window_served_when_buffer_holds_limit_samples(self):
+        buf = TrendBuffer(capacity=100)
+        for i in range(1000):
+            buf.append("A", float(i), float(i))
+        arr = buf.window("A", 0.0, limit=100)
+        self.assertEqual(len(arr), 100)
+        self.assertEqual(arr[-1, 0], 999.0)
+
+    def test_late_sample_is_inserted_in_order(self):
+        buf = TrendBuffer(capacity=100)
+        for ts in (1.0, 2.0, 4.0):
+            buf.append("A", ts, ts)
+        buf.append("A", 3.0, 30.0)  # e.g. write_tag stamped between two polls
+        arr = buf.window("A", 1.0, limit=10)
+        np.testing.assert_array_equal(arr[:, 0], [1.0, 2.0, 3.0, 4.0])
+        np.testing.assert_array_equal(arr[:, 1], [1.0, 2.0, 30.0, 4.0])
+
+    def test_sample_older_than_start_is_dropped(self):
+        buf = TrendBuffer(capacity=100)
+        buf.append("A", 10.0, 1.0)
+        buf.append("A", 5.0, 2.0)
+        self.assertIsNone(buf.window("A", 5.0, limit=10))
+        arr = buf.window("A", 10.0, limit=10)
+        np.testing.assert_array_equal(arr[:, 0], [10.0])
+
+    def test_retain_drops_other_series(self):
+        buf = TrendBuffer(capacity=100)
+        buf.append("A", 1.0, 1.0)
+        buf.append("B", 1.0, 1.0)
+        buf.retain(["A"])
+        self.assertIsNotNone(buf.window("A", 1.0))
+        self.assertIsNone(buf.window("B", 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
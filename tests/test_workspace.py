@@ -0,0 +1,93 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.drivers.s7_driver import TagSpec
+from app.storage.workspace import WorkspaceStorage
+
+
+class PruneTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.storage = WorkspaceStorage(str(Path(self._tmp.name) / "workspace.db"))
+
+    def tearDown(self):
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def _count(self, tag_name):
+        cur = self.storage.conn.execute("SELECT COUNT(*) FROM samples WHERE tag_name = ?", (tag_name,))
+        return cur.fetchone()[0]
+
+    def test_prune_removes_samples_of_removed_tags(self):
+        self.storage.upsert_tags([TagSpec("Keep", "DB", 1, 0, "REAL"), TagSpec("Gone", "DB", 1, 4, "REAL")])
+        now = time.time()
+        self.storage.insert_samples([
+            ("Keep", now - 7200, 1.0),
+            ("Keep", now, 2.0),
+            ("Gone", now - 7200, 3.0),
+            ("Gone", now, 4.0),
+        ])
+        # tag removed from the workspace; its samples stay behind
+        self.storage.conn.execute("DELETE FROM tags WHERE name = ?", ("Gone",))
+
+        removed = self.storage.prune(3600)
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(self._count("Keep"), 1)
+        self.assertEqual(self._count("Gone"), 1)
+
+    def test_prune_deletes_in_batches(self):
+        self.storage.PRUNE_BATCH = 7
+        now = time.time()
+        self.storage.insert_samples([("A", now - 7200 + i, float(i)) for i in range(50)])
+        self.storage.insert_samples([("A", now, 1.0)])
+
+        self.assertEqual(self.storage.prune(3600), 50)
+        self.assertEqual(self._count("A"), 1)
+
+    def test_prune_uses_ts_index(self):
+        plan = self.storage.conn.execute(
+            "EXPLAIN QUERY PLAN " + WorkspaceStorage._SQL_PRUNE, (0.0, 1)
+        ).fetchall()
+        self.assertTrue(any("idx_samples_ts " in row[-1] for row in plan), plan)
+
+    def test_retention_thread_prunes_on_start(self):
+        now = time.time()
+        self.storage.insert_samples([("A", now - 7200, 1.0), ("A", now, 2.0)])
+        self.storage.start_retention(3600, interval_s=3600)
+        deadline = time.monotonic() + 5
+        while self._count("A") > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._count("A"), 1)
+
+
+class LatestValuesTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.storage = WorkspaceStorage(str(Path(self._tmp.name) / "workspace.db"))
+
+    def tearDown(self):
+        self.storage.close()
+        self._tmp.cleanup()
+
+    def test_latest_value_per_tag(self):
+        self.storage.insert_samples([("A", 1.0, 1.0), ("A", 2.0, 2.0), ("B", 1.0, 3.0)])
+        self.assertEqual(self.storage.get_latest_values(), {"A": 2.0, "B": 3.0})
+        self.assertEqual(self.storage.get_latest_values(["B", "C"]), {"B": 3.0})
+
+    def test_includes_tags_removed_from_workspace(self):
+        self.storage.upsert_tags([TagSpec("Keep", "DB", 1, 0, "REAL"), TagSpec("Gone", "DB", 1, 4, "REAL")])
+        self.storage.insert_samples([("Keep", 1.0, 1.0), ("Gone", 1.0, 2.0), ("Unlisted", 1.0, 3.0)])
+        self.storage.conn.execute("DELETE FROM tags WHERE name = ?", ("Gone",))
+        self.assertEqual(
+            self.storage.get_latest_values(), {"Keep": 1.0, "Gone": 2.0, "Unlisted": 3.0}
+        )
+
+    def test_empty_samples(self):
+        self.assertEqual(self.storage.get_latest_values(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()